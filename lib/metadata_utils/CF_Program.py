@@ -3,10 +3,12 @@ import logging
 import os
 import re
 import unicodedata
+from collections.abc import Callable
 from pathlib import Path
 
 import hjson
 import xxhash
+from mutagen import PaddingInfo
 from mutagen.id3 import (
     APIC,
     COMM,
@@ -31,6 +33,11 @@ from .embed_lyrics import (
     convert_lyric_simple,
     get_embedded_lyrics,
 )
+from .fingerprint import get_audio_fingerprint
+from .hashing import DEFAULT_SCHEME, LEGACY, get_sampled_hash, parse_hash
+from .journal import atomic_rename, atomic_update
+from .padding import PaddingPolicy, expected_headroom, needs_rewrite, rendered_size
+from .storage import HASH_TAIL_SIZE, ID3V1_SIZE, LOCAL_STORAGE, Storage
 
 logger = logging.getLogger(__name__)
 
@@ -69,6 +76,10 @@ class Song:
     Comment: str = ''
     Special: str = ''
     xxHash: str = ''
+    AudioHash: str = '' # versioned xxh3 identifier, see hashing.py
+
+    # write to a temp copy and swap it in, so a crash never leaves a half written file
+    atomic_writes: bool = False
 
     def __repr__(self) -> str:
         return self.filename
@@ -183,13 +194,18 @@ class Song:
             "Track", 
             "Comment",
             "Special",
-            "xxHash"
+            "xxHash",
+            "AudioHash"
             )
 
-    def __init__(self, path: Path | str, allow_incompatible : bool = False):
+    # added after the archive was built, left out of the payload while empty so existing payloads don't change
+    OPTIONAL_FIELDS = ("AudioHash",)
+
+    def __init__(self, path: Path | str, allow_incompatible : bool = False, storage: Storage | None = None):
         self.path = Path(path)
+        self.storage = storage or LOCAL_STORAGE
 
-        if not self.path.exists() or self.path.is_dir():
+        if not self.storage.is_file(self.path):
             raise ValueError("The specified path is invalid!",
                             f"Invalid path: {self.path}")
 
@@ -255,7 +271,8 @@ class Song:
         path = Path(self.path)
 
         try:
-            tags = TinyTag.get(path, tags=True, image=False)
+            with self.storage.open(path, tail=ID3V1_SIZE) as f:
+                tags = TinyTag.get(path, file_obj=f, tags=True, duration=False, image=False)
 
         except UnsupportedFormatError:
             return ""
@@ -291,15 +308,42 @@ class Song:
 
         for field in self.FIELDS:
             field_value = getattr(self, field)
+            if not field_value and field in self.OPTIONAL_FIELDS:
+                continue
             field_value = field_value if field_value else "None"
             payload[field] = field_value
         
         return json.dumps(payload, separators=(',', ':'))
     
-    def set_tags(self) -> None:
+    def _load_id3(self) -> ID3:
+        with self.storage.open(self.path, tail=ID3V1_SIZE) as f:
+            return ID3(f)
+
+    def padding_policy(self, tags: ID3) -> PaddingPolicy:
+
+        """Padding that leaves room for the frames this song is still missing (lyrics, cover)."""
+
+        cover = self.album_cover
+        image_size = cover.stat().st_size if cover and cover.is_file() else 0
+
+        return PaddingPolicy(reserve=expected_headroom(tags, image_size))
+
+    def _write_tags(self, tags: ID3, padding: Callable[[PaddingInfo], int] | None = None) -> None:
+
+        # only resizes the tag block (and moves the audio) when the new frames don't fit the padding
+        padding = padding or self.padding_policy(tags)
+
+        if self.atomic_writes:
+            atomic_update(self.path, lambda path: tags.save(path, padding=padding))
+        else:
+            tags.save(self.path, padding=padding)
+
+        self.storage.invalidate(self.path)
+
+    def _build_tags(self) -> ID3:
 
         try:
-            tags = ID3(self.path)
+            tags = self._load_id3()
         except ID3NoHeaderError:
             # If no tags exist, create a blank ID3 object
             tags = ID3()
@@ -316,8 +360,56 @@ class Song:
         tags.add(COMM(encoding=3, lang='ved', desc='', text=[self.build_payload()]))
         tags.add(COMM(encoding=2,lang='eng', desc='',text=[self.COMM_ENG]))
         tags.add(COMM(encoding=2,lang='eng', desc='ID3v1 Comment',text=[self.COMM_ENG]))
-        
-        tags.save(self.path)
+
+        return tags
+
+    def set_tags(self) -> None:
+        self._write_tags(self._build_tags())
+
+    def would_rewrite_audio(self) -> bool:
+
+        """Whether set_tags would have to move the audio instead of rewriting the tag block in place."""
+
+        tags = self._build_tags()
+        return needs_rewrite(tags, self.padding_policy(tags))
+
+    def _image_frame(self, image_path: Path) -> APIC | None:
+
+        image_data = image_path.read_bytes()
+
+        image_type = image_path.suffix.strip(".")
+        if image_type.lower() == "jpg":
+            image_type = "jpeg"
+
+        if not (image_data and (image_type.lower() in ("jpeg", "png"))):
+            return None
+
+        return APIC(
+            encoding=3,       
+            mime=f'image/{image_type.lower()}', 
+            type=3, 
+            desc='Cover (Front)', 
+            data=image_data
+        )
+
+    def repad(self) -> bool:
+
+        """
+        Resize the padding of the tags already in the file, so the next set_tags fits in place.
+        No frame is changed. False when the file has no ID3 tag.
+        """
+
+        try:
+            tags = self._load_id3()
+        except ID3NoHeaderError:
+            return False
+
+        built = self._build_tags()
+        # leave the policy's padding once the built tags replace the current ones
+        padding = max(rendered_size(built) + self.padding_policy(built).target - rendered_size(tags), 0)
+
+        self._write_tags(tags, padding=lambda info: padding)
+        return True
 
     def set_image(self, image_path: Path):
 
@@ -325,42 +417,37 @@ class Song:
             print("Please select a valid image!")
             return
 
-        image_data = image_path.read_bytes()
+        frame = self._image_frame(image_path)
 
         try:
-            tags = ID3(self.path)
+            tags = self._load_id3()
         except ID3NoHeaderError:
             tags = ID3()
 
-        image_type = image_path.suffix.strip(".")
-        if image_type.lower() == "jpg":
-            image_type = "jpeg"
-
-        if image_data and (image_type.lower() in ("jpeg", "png")):
+        if frame is not None:
 
             tags.delall('APIC') 
-                
-            tags.add(
-                APIC(
-                    encoding=3,       
-                    mime=f'image/{image_type.lower()}', 
-                    type=3, 
-                    desc='Cover (Front)', 
-                    data=image_data
-                )
-            )
+            tags.add(frame)
             logger.debug("Image added to APIC frame")
 
-            tags.save()
+            self._write_tags(tags)
 
-    def set_album_image(self):
+    @property
+    def album_cover(self) -> Path | None:
 
         if ALBUMS_COVER_PATH is None:
-            return
+            return None
 
         cover_image = title_match if (title_match := ALBUM_COVERS.get(self.TitleOG)) else ALBUM_COVERS.get(self.Discnumber, "") 
 
-        self.set_image(ALBUMS_COVER_PATH / cover_image)
+        return ALBUMS_COVER_PATH / cover_image
+
+    def set_album_image(self):
+
+        if (cover := self.album_cover) is None:
+            return
+
+        self.set_image(cover)
 
 
     def rename(self) -> None:
@@ -369,11 +456,16 @@ class Song:
         if new_path == self.path:
             return
 
-        if new_path.exists() and new_path.is_file():
+        if self.storage.is_file(new_path):
             raise FileExistsError(f"{new_path} already exists!")
         else:
             try:
-                os.rename(self.path, new_path)
+                if self.atomic_writes:
+                    atomic_rename(self.path, new_path)
+                    self.storage.invalidate(self.path)
+                    self.storage.invalidate(new_path)
+                else:
+                    self.storage.rename(self.path, new_path)
 
             except Exception:
                 raise
@@ -383,37 +475,106 @@ class Song:
 
     def get_hash(self) -> str | None:
         try:
-            file_size = self.path.stat().st_size
+            file_size = self.storage.info(self.path).size
             if file_size < 3000:
                 print(f"{self.path.name} is too small!")
                 return None
 
-            with open(self.path, 'rb') as f:
-                xxhash = get_audio_hash(f.read(), file_size)
+            # only the end of the file is needed, no need to read the whole song
+            with self.storage.open(self.path, head=0, tail=HASH_TAIL_SIZE) as f:
+                xxhash = get_audio_hash(f, file_size)
                 return xxhash
                 
         except Exception as e:
             print(f"Error processing {self.path}: {e}")
             return None
 
-    def make_hjson(self, output_folder: Path | str):
+    def get_hashes(self, schemes: tuple[str, ...] = (LEGACY, DEFAULT_SCHEME)) -> dict[str, str]:
 
-        output_folder = Path(output_folder)
+        """scheme -> identifier, all of them from a single read of the file."""
 
-        if not (output_folder.exists() and output_folder.is_dir()):
-            print("Please Pass a Valid Folder!",
-                 f"Invalid Folder: {output_folder}")
-            return
+        hashes: dict[str, str] = {}
+
+        try:
+            file_size = self.storage.info(self.path).size
+            if file_size < 3000:
+                print(f"{self.path.name} is too small!")
+                return hashes
 
-        song_data = {field: value for field in self.FIELDS if (value := getattr(self, field))}
+            # the legacy window and the sampled ones share the cached segments
+            with self.storage.open(self.path, tail=HASH_TAIL_SIZE) as f:
+                for scheme in schemes:
+                    value = get_audio_hash(f, file_size) if scheme == LEGACY else get_sampled_hash(f, file_size, scheme)
+                    if value:
+                        hashes[scheme] = value
 
-        if not song_data:
-            print("No data found")
-            return
+        except Exception as e:
+            print(f"Error processing {self.path}: {e}")
 
-        filename = self.filename.replace(".mp3", ".hjson")
-        directory = self.path.parent.name
-        output_location = output_folder / directory / filename
+        return hashes
+
+    @property
+    def identities(self) -> tuple[str, ...]:
+
+        """Every hash this song is known by, legacy first."""
+
+        return tuple(value for value in (self.xxHash, self.AudioHash) if value)
+
+    def verified_hashes(self, scheme: str = DEFAULT_SCHEME) -> dict[str, str] | None:
+
+        """
+        Legacy and new hash of the audio, both computed in the same pass.
+        None when the legacy hash in the tags no longer matches the audio: the record may belong to another file.
+        """
+
+        hashes = self.get_hashes((LEGACY, scheme))
+        if LEGACY not in hashes or scheme not in hashes:
+            return None
+
+        if self.xxHash and self.xxHash != hashes[LEGACY]:
+            print(f"{self.path.name}: tags say {self.xxHash} but the audio hashes to {hashes[LEGACY]}")
+            return None
+
+        return hashes
+
+    def migrate_hash(self, scheme: str = DEFAULT_SCHEME) -> bool:
+
+        """Store the new hash next to the legacy one. False when refused (see verified_hashes) or already done."""
+
+        hashes = self.verified_hashes(scheme)
+        if hashes is None:
+            return False
+
+        if self.AudioHash and parse_hash(self.AudioHash) == parse_hash(hashes[scheme]):
+            return False
+
+        self.xxHash = hashes[LEGACY]
+        self.AudioHash = hashes[scheme]
+        return True
+
+    def get_fingerprint(self) -> tuple[str, ...] | None:
+        try:
+            file_size = self.storage.info(self.path).size
+            if file_size < 3000:
+                print(f"{self.path.name} is too small!")
+                return None
+
+            # only the sampled windows are actually read
+            with self.storage.open(self.path, tail=ID3V1_SIZE) as f:
+                return get_audio_fingerprint(f, file_size)
+
+        except Exception as e:
+            print(f"Error processing {self.path}: {e}")
+            return None
+
+    def hjson_data(self) -> dict[str, str | int | float]:
+
+        """Record as written to hjson, numbers typed like the rest of the repository. Empty if there's no data."""
+
+        song_data: dict[str, str | int | float] = {field: value for field in self.FIELDS if (value := getattr(self, field))}
+
+        if not song_data:
+            return song_data
 
         song_data["Discnumber"] = int(self.Discnumber)
         song_data["Special"] = int(self.Special)
@@ -429,6 +590,32 @@ class Song:
         if song_data["Special"] == 0:
             del song_data["Special"]
 
+        return song_data
+
+    def hjson_path(self, output_folder: Path | str) -> Path:
+
+        filename = self.filename.replace(".mp3", ".hjson")
+        directory = self.path.parent.name
+
+        return Path(output_folder) / directory / filename
+
+    def make_hjson(self, output_folder: Path | str):
+
+        output_folder = Path(output_folder)
+
+        if not (output_folder.exists() and output_folder.is_dir()):
+            print("Please Pass a Valid Folder!",
+                 f"Invalid Folder: {output_folder}")
+            return
+
+        song_data = self.hjson_data()
+
+        if not song_data:
+            print("No data found")
+            return
+
+        output_location = self.hjson_path(output_folder)
+
         os.makedirs(output_location.parent, exist_ok=True)
         with open(output_location, 'w', encoding='utf-8') as f:
             hjson.dump(song_data, f)
@@ -444,18 +631,12 @@ class Song:
         print("COMM_ENG: ", self.COMM_ENG)
         print("TRCK: ", self.TRCK)
 
-    def embed_lyrics(self, lrc_path: Path | str):
-        tags = ID3(self.path)    
-
-        embedded_lyrics = set(map(str.strip, get_embedded_lyrics(self.path)))
-        # 1. Parse the LRC file into (text, timestamp) tuples
+    def embedded_lyrics(self) -> set[str]:
+        with self.storage.open(self.path, tail=ID3V1_SIZE) as f:
+            return set(map(str.strip, get_embedded_lyrics(self.path, file_obj=f)))
 
-        with open(lrc_path, 'r', encoding='utf-8') as f:
-            lyrics = f.read().strip()
+    def _add_lyrics(self, tags: ID3, lyrics: str) -> None:
 
-        if lyrics in embedded_lyrics:
-            return
-            
         bilingual = contains_cjk(lyrics)
         sylt_data = convert_lyric_complex(lyrics=lyrics) if bilingual is True else convert_lyric_simple(lyrics=lyrics)  
                     
@@ -479,18 +660,33 @@ class Song:
             type=1,
             text=sylt_data
         ))
+
+    def embed_lyrics(self, lrc_path: Path | str):
+        tags = self._load_id3()
+
+        embedded_lyrics = self.embedded_lyrics()
+        # 1. Parse the LRC file into (text, timestamp) tuples
+
+        with open(lrc_path, 'r', encoding='utf-8') as f:
+            lyrics = f.read().strip()
+
+        if lyrics in embedded_lyrics:
+            return
+
+        self._add_lyrics(tags, lyrics)
         
         # print(sylt_data)
 
-        tags.save()
+        self._write_tags(tags)
         logger.debug(f"Successfully embedded synced lyrics into {self.path}")
 
-def get_all_mp3_as_obj(directory: Path | str) -> list[Song]: 
+def get_all_mp3_as_obj(directory: Path | str, storage: Storage | None = None) -> list[Song]: 
     """
     Returns as Song objects all mp3 files from a directory and it's sub-directories.
+    The files are listed and loaded concurrently through the storage layer.
     """
-    p = Path(directory)
-    return [(Song(f)) for f in p.rglob('*.mp3') if f.is_file()]
+    storage = storage or LOCAL_STORAGE
+    return storage.map(lambda f: Song(f, storage=storage), storage.scan(directory, '.mp3'))
 
 def sanitize_filename(filename: str) -> str:
     FORBIDDEN_CHARS = {
@@ -1,14 +1,15 @@
 import re
 from pathlib import Path
+from typing import BinaryIO
 
 from tinytag import TinyTag
 
 
-def get_embedded_lyrics(path: Path | str) -> set[str]:
+def get_embedded_lyrics(path: Path | str, file_obj: BinaryIO | None = None) -> set[str]:
 
     path = Path(path)
 
-    tags = TinyTag.get(path, tags=True, image=False)
+    tags = TinyTag.get(path, file_obj=file_obj, tags=True, image=False)
 
     lyrics = tags.other.get("lyrics") or []
 
@@ -0,0 +1,121 @@
+import logging
+import os
+from pathlib import Path
+
+import hjson
+
+from .CF_Program import Song, get_all_mp3_as_obj
+from .storage import LOCAL_STORAGE, Storage
+
+logger = logging.getLogger(__name__)
+
+ADDED = "added"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+
+
+class ExportReport:
+
+    def __init__(self):
+        self.added: list[Path] = []
+        self.changed: list[Path] = []
+        self.unchanged: list[Path] = []
+        self.removed: list[Path] = []
+        self.failed: list[Path] = []
+
+    def __str__(self) -> str:
+        return (f"{len(self.added)} added, {len(self.changed)} changed, {len(self.unchanged)} unchanged, "
+                f"{len(self.removed)} removed, {len(self.failed)} failed")
+
+
+def export_song(song: Song, output_folder: Path, dry_run: bool = False) -> tuple[str, Path]:
+
+    """
+    Write the song's record only if its content differs from the file already there.
+    Returns (status, hjson path), or (FAILED, mp3 path).
+    """
+
+    try:
+        song_data = song.hjson_data()
+    except ValueError as e:
+        print(f"Error processing {song.path}: {e}")
+        return FAILED, song.path
+
+    if not song_data:
+        print(f"No data found: {song.path}")
+        return FAILED, song.path
+
+    output_location = song.hjson_path(output_folder)
+    content = hjson.dumps(song_data)
+
+    try:
+        with open(output_location, 'r', encoding='utf-8', newline='') as f:
+            old_content = f.read()
+    except FileNotFoundError:
+        old_content = None
+
+    if old_content == content:
+        return UNCHANGED, output_location
+
+    if not dry_run:
+        os.makedirs(output_location.parent, exist_ok=True)
+        with open(output_location, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+
+    return (ADDED if old_content is None else CHANGED), output_location
+
+def _record_hash(path: Path) -> str:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return str(hjson.load(f).get("xxHash", ""))
+    except Exception:
+        return ""
+
+def export_library(library: Path | str, output_folder: Path | str, storage: Storage | None = None,
+                   prune: bool = False, dry_run: bool = False) -> ExportReport:
+
+    """
+    Regenerate the hjson tree from the mp3 library, loading and comparing songs in parallel.
+    Records with no mp3 behind them are reported as removed, and deleted with prune.
+    """
+
+    output_folder = Path(output_folder)
+    storage = storage or LOCAL_STORAGE
+    report = ExportReport()
+
+    songs = get_all_mp3_as_obj(library, storage=storage)
+    results = storage.map(lambda song: export_song(song, output_folder, dry_run), songs)
+
+    exported: set[Path] = set()
+    failed_hashes: set[str] = set()
+    for song, (status, path) in zip(songs, results):
+        getattr(report, status).append(path)
+        if status != FAILED:
+            exported.add(path)
+            continue
+
+        # the record is still there, it just couldn't be regenerated
+        if song.xxHash:
+            failed_hashes.add(song.xxHash)
+        try:
+            exported.add(song.hjson_path(output_folder))
+        except Exception:
+            pass
+
+    if prune and report.failed:
+        print(f"Not pruning, {len(report.failed)} song(s) failed to export")
+        prune = False
+
+    for path in sorted(output_folder.rglob('*.hjson')):
+        if path in exported or any(part.startswith('.') for part in path.relative_to(output_folder).parts):
+            continue
+
+        if failed_hashes and _record_hash(path) in failed_hashes:
+            continue
+
+        report.removed.append(path)
+        if prune and not dry_run:
+            path.unlink()
+
+    return report
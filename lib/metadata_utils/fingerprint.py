@@ -0,0 +1,250 @@
+import json
+import logging
+from collections import Counter, defaultdict
+from collections.abc import Hashable, Iterable, Iterator
+from pathlib import Path
+
+import xxhash
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SIZE = 987 # same window length as get_audio_hash
+WINDOW_STRIDE = 262_144 # distance between two sampled windows
+FINGERPRINT_WINDOWS = 8 # half anchored to the start of the audio, half to the end
+ANCHOR_BYTES = 32 # bytes after a frame sync that decide whether it's an anchor
+ANCHOR_MODULUS = 64 # about one anchor every 20-30 KB of audio
+ANCHOR_CHUNK = 16_384 # read while looking for an anchor
+ANCHOR_SEARCH_LIMIT = 131_072 # how far to look for an anchor before giving up
+FINGERPRINT_VERSION = 2 # bumped whenever the windows move, saved indexes from another version are rebuilt
+MIN_DISTINCT_BYTES = 32 # windows below this are most likely silence
+DEFAULT_MIN_SHARED = 3
+DEFAULT_MAX_BUCKET = 16
+
+
+def get_audio_bounds(file: bytes, file_size: int) -> tuple[int, int]:
+
+    """Return the (start, end) offsets of the audio, skipping the ID3v2 header and the ID3v1 footer."""
+
+    start = 0
+    if file[:3] == b'ID3':
+        header = file[:10]
+        # syncsafe integer, 7 bits per byte
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        start = 10 + size
+        if header[5] & 0x10: # footer present
+            start += 10
+
+    end = file_size
+    if file[-128:-128+3] == b'TAG':
+        end -= 128
+
+    return start, end
+
+def _is_anchor(data: bytes, index: int) -> bool:
+    return (
+        data[index + 1] & 0xE0 == 0xE0
+        and xxhash.xxh32_intdigest(data[index:index + ANCHOR_BYTES]) % ANCHOR_MODULUS == 0
+    )
+
+def _find_anchor(file: bytes, position: int, end: int) -> int:
+
+    """
+    Move position forward to the next content-defined anchor: a frame sync whose next ANCHOR_BYTES hash to 0.
+    Whether a spot is an anchor depends only on the bytes there, so in two copies of a song shifted by a trim
+    the search lands on the same audio, unless the trim is longer than the gap to the next anchor.
+    """
+
+    limit = min(position + ANCHOR_SEARCH_LIMIT, end - WINDOW_SIZE)
+    chunk_start = position
+
+    while chunk_start < limit:
+        chunk_end = min(chunk_start + ANCHOR_CHUNK, limit)
+        # a little past the chunk, so an anchor at its very end can still be hashed
+        data = file[chunk_start:chunk_end + ANCHOR_BYTES]
+        index = data.find(b'\xff', 0, chunk_end - chunk_start)
+
+        while index != -1:
+            if _is_anchor(data, index):
+                return chunk_start + index
+            index = data.find(b'\xff', index + 1, chunk_end - chunk_start)
+
+        chunk_start = chunk_end
+
+    return position
+
+def get_window_offsets(start: int, end: int, windows: int = FINGERPRINT_WINDOWS) -> list[int]:
+
+    """
+    Offsets of the sampled windows. The first half is counted from the start of the audio
+    and the second half from the end, so a file trimmed on one side still shares the other half.
+    """
+
+    offsets: list[int] = []
+    head = windows - windows // 2
+
+    for i in range(1, head + 1):
+        offset = start + i * WINDOW_STRIDE
+        if offset + WINDOW_SIZE > end:
+            break
+        offsets.append(offset)
+
+    for i in range(1, windows // 2 + 1):
+        offset = end - i * WINDOW_STRIDE
+        if offset < start:
+            break
+        offsets.append(offset)
+
+    return offsets
+
+def get_audio_fingerprint(file: bytes, file_size: int, windows: int = FINGERPRINT_WINDOWS) -> (tuple[str, ...] | None):
+
+    """
+    Hash several windows of the audio instead of the single one used by get_audio_hash.
+    Each window starts at the first anchor after its offset, so a trim shorter than the gap between anchors
+    keeps the windows on both ends; a longer one only keeps those anchored to the untrimmed end.
+    `file` can be anything that slices like bytes, an mmap avoids reading the whole file.
+    """
+
+    try:
+        start, end = get_audio_bounds(file, file_size)
+
+        hashes: list[str] = []
+        for offset in get_window_offsets(start, end, windows):
+            offset = _find_anchor(file, offset, end)
+            raw_audio = file[offset:offset + WINDOW_SIZE]
+
+            if len(set(raw_audio)) < MIN_DISTINCT_BYTES:
+                continue
+
+            hashes.append(xxhash.xxh64(raw_audio).hexdigest())
+
+        return tuple(dict.fromkeys(hashes))
+
+    except Exception:
+        logger.exception("Failed to fingerprint audio")
+        return None
+
+
+class FingerprintIndex:
+
+    """Inverted index of window hash -> keys, used to find likely duplicates without comparing every pair."""
+
+    def __init__(self, min_shared: int = DEFAULT_MIN_SHARED, max_bucket: int = DEFAULT_MAX_BUCKET):
+        self.min_shared = min_shared
+        # windows shared by more songs than this are treated as noise (silence, encoder padding)
+        self.max_bucket = max_bucket
+        self.fingerprints: dict[Hashable, tuple[str, ...]] = {}
+        self.buckets: defaultdict[str, set[Hashable]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.fingerprints
+
+    def add(self, key: Hashable, fingerprint: Iterable[str]) -> None:
+
+        if key in self.fingerprints:
+            self.remove(key)
+
+        fingerprint = tuple(fingerprint)
+        self.fingerprints[key] = fingerprint
+
+        for window_hash in fingerprint:
+            self.buckets[window_hash].add(key)
+
+    def remove(self, key: Hashable) -> None:
+
+        fingerprint = self.fingerprints.pop(key, ())
+
+        for window_hash in fingerprint:
+            bucket = self.buckets[window_hash]
+            bucket.discard(key)
+            if not bucket:
+                del self.buckets[window_hash]
+
+    def _threshold(self, fingerprint: tuple[str, ...]) -> int:
+        # short files have fewer windows, never ask for more than they have
+        return max(1, min(self.min_shared, len(fingerprint)))
+
+    def query(self, fingerprint: Iterable[str]) -> list[tuple[Hashable, int]]:
+
+        """Return (key, shared windows) for every indexed song above the threshold, best first."""
+
+        fingerprint = tuple(fingerprint)
+        counts: Counter[Hashable] = Counter()
+
+        for window_hash in fingerprint:
+            bucket = self.buckets.get(window_hash, ())
+            if len(bucket) > self.max_bucket:
+                continue
+            counts.update(bucket)
+
+        threshold = self._threshold(fingerprint)
+        return [(key, shared) for key, shared in counts.most_common() if shared >= threshold]
+
+    def match(self, fingerprint: Iterable[str]) -> (Hashable | None):
+
+        """Return the first indexed song above the threshold, stopping as soon as one is found."""
+
+        fingerprint = tuple(fingerprint)
+        threshold = self._threshold(fingerprint)
+        counts: Counter[Hashable] = Counter()
+
+        for window_hash in fingerprint:
+            bucket = self.buckets.get(window_hash, ())
+            if len(bucket) > self.max_bucket:
+                continue
+
+            for key in bucket:
+                counts[key] += 1
+                if counts[key] >= threshold:
+                    return key
+
+        return None
+
+    def duplicates(self) -> Iterator[tuple[Hashable, Hashable, int]]:
+
+        """Yield (key, key, shared windows) for every indexed pair above the threshold."""
+
+        pairs: Counter[tuple[Hashable, Hashable]] = Counter()
+
+        for bucket in self.buckets.values():
+            if len(bucket) < 2 or len(bucket) > self.max_bucket:
+                continue
+
+            keys = sorted(bucket, key=str)
+            for i, first in enumerate(keys):
+                for second in keys[i + 1:]:
+                    pairs[(first, second)] += 1
+
+        for (first, second), shared in pairs.most_common():
+            threshold = self._threshold(min(self.fingerprints[first], self.fingerprints[second], key=len))
+            if shared >= threshold:
+                yield first, second, shared
+
+    def save(self, path: Path | str) -> None:
+
+        data = {
+            "version": FINGERPRINT_VERSION,
+            "fingerprints": {str(key): list(fingerprint) for key, fingerprint in self.fingerprints.items()},
+        }
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: Path | str, **kwargs) -> "FingerprintIndex":
+
+        index = cls(**kwargs)
+
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        if data.get("version") != FINGERPRINT_VERSION:
+            raise ValueError(f"{path} was built by another fingerprint version, it has to be rebuilt")
+
+        for key, fingerprint in data["fingerprints"].items():
+            index.add(key, fingerprint)
+
+        return index
@@ -0,0 +1,112 @@
+import logging
+from typing import NamedTuple
+
+import xxhash
+
+from .fingerprint import FINGERPRINT_WINDOWS, WINDOW_SIZE, get_audio_bounds, get_window_offsets
+
+logger = logging.getLogger(__name__)
+
+LEGACY = "xxh64" # get_audio_hash, the bare hex in every xxHash field
+XXH3_64 = "xxh3_64"
+XXH3_128 = "xxh3_128"
+DEFAULT_SCHEME = XXH3_128
+
+# bumped whenever the sampled bytes change, so old and new digests are never compared
+SAMPLING_VERSION = 1
+BARE_DIGEST_VERSION = 1 # a bare xxh3_128 digest always means this version, never the current one
+
+HASHERS = {
+    XXH3_64: xxhash.xxh3_64,
+    XXH3_128: xxhash.xxh3_128,
+}
+
+
+class HashId(NamedTuple):
+
+    """
+    Versioned audio hash identifier.
+    Written as "scheme:version:digest", legacy xxh64 values stay bare hex so the existing records keep working.
+    """
+
+    scheme: str
+    version: int
+    digest: str
+
+    def __str__(self) -> str:
+
+        if self.scheme == LEGACY:
+            return self.digest
+
+        return f"{self.scheme}:{self.version}:{self.digest}"
+
+
+def parse_hash(value: str) -> HashId:
+
+    """
+    Accepts both forms: "xxh3_128:1:<hex>" and bare hex.
+    A bare 32 digit hex can only be an xxh3_128 digest of version 1, a 16 digit one is taken as the legacy xxh64.
+    """
+
+    value = value.strip().lower()
+    parts = value.split(':')
+
+    if len(parts) == 3:
+        scheme, version, digest = parts
+        if scheme not in HASHERS or not version.isdigit():
+            raise ValueError(f"Unknown hash identifier: {value}")
+        return HashId(scheme, int(version), digest)
+
+    if len(parts) != 1:
+        raise ValueError(f"Unknown hash identifier: {value}")
+
+    if len(value) == 32:
+        return HashId(XXH3_128, BARE_DIGEST_VERSION, value)
+
+    return HashId(LEGACY, 0, value)
+
+def hash_key(value: str) -> str:
+
+    """Canonical form of an identifier, for dictionary keys."""
+
+    try:
+        return str(parse_hash(value))
+    except ValueError:
+        return value
+
+def same_audio(a: str, b: str) -> bool:
+
+    """Whether two identifiers, in either form, are the same hash of the same audio."""
+
+    try:
+        return parse_hash(a) == parse_hash(b)
+    except ValueError:
+        return False
+
+def get_sampled_hash(file: bytes, file_size: int, scheme: str = DEFAULT_SCHEME) -> (str | None):
+
+    """
+    xxh3 over the audio length and raw windows at the same offsets get_audio_fingerprint starts from.
+    Unlike the fingerprint, the windows aren't aligned on frame syncs and low-entropy ones aren't skipped.
+    Only the audio is read, the ID3 tags before and after it can change without changing the hash.
+    """
+
+    try:
+        hasher = HASHERS[scheme]()
+        start, end = get_audio_bounds(file, file_size)
+
+        hasher.update((end - start).to_bytes(8, 'little'))
+
+        offsets = get_window_offsets(start, end, FINGERPRINT_WINDOWS)
+        if not offsets:
+            # shorter than a window stride, all of it is cheap enough
+            hasher.update(file[start:end])
+
+        for offset in offsets:
+            hasher.update(file[offset:offset + WINDOW_SIZE])
+
+        return str(HashId(scheme, SAMPLING_VERSION, hasher.hexdigest()))
+
+    except Exception:
+        logger.exception("Failed to hash audio")
+        return None
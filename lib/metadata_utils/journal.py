@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import re
+import shutil
+import uuid
+from collections.abc import Callable
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import xxhash
+
+if TYPE_CHECKING:
+    from .CF_Program import Song
+
+logger = logging.getLogger(__name__)
+
+# also matches the .tmp.mp3 names written by earlier versions
+TEMP_NAME = re.compile(r'^\..+\.[0-9a-f]{8}\.tmp(\.\w+)?$')
+
+
+def temp_path_for(path: Path) -> Path:
+
+    """
+    Hidden temp file next to path, same folder so the final rename can't cross filesystems.
+    Ends in .tmp, so a copy left by a killed run is never taken for a song.
+    """
+
+    return path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+
+def remove_stale_temps(directory: Path) -> list[Path]:
+
+    """Delete the temp files a killed run left in directory and its sub-folders."""
+
+    removed: list[Path] = []
+
+    for path in Path(directory).rglob('.*.tmp*'):
+        if TEMP_NAME.match(path.name) and path.is_file():
+            path.unlink(missing_ok=True)
+            removed.append(path)
+
+    if removed:
+        logger.info(f"Removed {len(removed)} stale temp file(s) from {directory}")
+
+    return removed
+
+def fsync_dir(directory: Path) -> None:
+
+    # makes the rename itself durable, not supported on Windows
+    if os.name == "nt":
+        return
+
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def fsync_file(path: Path) -> None:
+    with open(path, 'rb+') as f:
+        os.fsync(f.fileno())
+
+def commit_temp(temp: Path, path: Path) -> None:
+
+    """fsync temp, then atomically put it in place of path."""
+
+    fsync_file(temp)
+    os.replace(temp, path)
+    fsync_dir(path.parent)
+
+def atomic_update(path: Path, write: Callable[[Path], object]) -> None:
+
+    """
+    Run write on a copy of path, then swap the copy in.
+    If anything fails, or the process dies, the original file is left untouched.
+    """
+
+    path = Path(path)
+    temp = temp_path_for(path)
+
+    try:
+        # copy2 keeps the permissions, copyfile would reset them to the umask
+        shutil.copy2(path, temp)
+        write(temp)
+        commit_temp(temp, path)
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+
+def atomic_rename(src: Path, dst: Path) -> None:
+
+    if dst.exists():
+        raise FileExistsError(f"{dst} already exists!")
+
+    os.rename(src, dst)
+    fsync_dir(dst.parent)
+
+def content_digest(data: str | bytes) -> str:
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return xxhash.xxh64(data).hexdigest()
+
+
+class Journal:
+
+    """
+    Append-only checkpoint log of completed (path, operation, digest) entries, one JSON object per line.
+    Every entry is fsynced before the next operation starts, so a killed batch resumes where it stopped.
+    """
+
+    def __init__(self, path: Path | str, library: Path | str | None = None):
+
+        """library: folder whose leftover temp files are deleted, besides the folders of the journaled songs."""
+
+        self.path = Path(path)
+        self.completed: set[tuple[str, str, str]] = set()
+        self.aliases: dict[str, str] = {} # path after a rename -> path before
+
+        if self.path.exists():
+            self._load()
+            self._drop_torn_line()
+
+        # copies of the songs that were being written when the last run was killed
+        folders = {Path(path).parent for path, _, _ in self.completed}
+        if library is not None:
+            folders.add(Path(library))
+        for folder in folders:
+            if folder.is_dir():
+                remove_stale_temps(folder)
+
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self) -> None:
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # half written last line, the operation it describes is redone
+                    logger.warning(f"Skipping corrupt journal line: {line!r}")
+                    continue
+
+                self._add(entry["path"], entry["operation"], entry["digest"])
+
+    def _drop_torn_line(self) -> None:
+
+        """Cut a last line left without its newline by a crash, the next entry would be appended onto it."""
+
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            if not data or data.endswith(b'\n'):
+                return
+
+            f.truncate(data.rfind(b'\n') + 1)
+            os.fsync(f.fileno())
+
+    def _add(self, path: str, operation: str, digest: str) -> None:
+
+        self.completed.add((path, operation, digest))
+
+        if operation == "rename":
+            self.aliases[str(Path(path).with_name(digest))] = path
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.completed)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def is_done(self, path: Path | str, operation: str, digest: str) -> bool:
+
+        path = str(path)
+        seen: set[str] = set()
+
+        # a song renamed in a previous run is found under its new name
+        while path not in seen:
+            if (path, operation, digest) in self.completed:
+                return True
+            seen.add(path)
+            path = self.aliases.get(path, path)
+
+        return False
+
+    def record(self, path: Path | str, operation: str, digest: str) -> None:
+
+        entry = {"path": str(path), "operation": operation, "digest": digest}
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        self._add(str(path), operation, digest)
+
+    def run(self, path: Path | str, operation: str, digest: str, action: Callable[[], object]) -> bool:
+
+        """Run action unless it's already in the journal. Returns whether it ran."""
+
+        if self.is_done(path, operation, digest):
+            return False
+
+        action()
+        self.record(path, operation, digest)
+        return True
+
+
+def journaled_save(song: "Song", journal: Journal) -> bool:
+
+    """Song.save with atomic writes, skipping whatever the journal says is already done."""
+
+    song.atomic_writes = True
+
+    ran = journal.run(song.path, "set_tags", content_digest(song.build_payload()), song.set_tags)
+    ran |= journal.run(song.path, "rename", song.filename, song.rename)
+
+    return ran
+
+def journaled_album_image(song: "Song", journal: Journal, image_path: Path) -> bool:
+
+    song.atomic_writes = True
+    digest = content_digest(image_path.read_bytes()) if image_path.is_file() else ""
+
+    return journal.run(song.path, "set_image", digest, lambda: song.set_image(image_path))
+
+def journaled_lyrics(song: "Song", journal: Journal, lrc_path: Path | str) -> bool:
+
+    song.atomic_writes = True
+    digest = content_digest(Path(lrc_path).read_bytes())
+
+    return journal.run(song.path, "embed_lyrics", digest, lambda: song.embed_lyrics(lrc_path))
@@ -0,0 +1,327 @@
+import bz2
+import csv
+import gzip
+import json
+import logging
+import lzma
+import re
+import sqlite3
+import tarfile
+import unicodedata
+from collections.abc import Iterable, Iterator
+from datetime import date
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import IO, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 10_000 # rows held in memory before they're written to the index
+MIN_ARTIST_SCORE = 0.6
+COVER_DATE_WINDOW = 31 # days
+FULL_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+PARENTHESES = re.compile(r'[\(\[（【].*?[\)\]）】]')
+NOT_ALPHANUMERIC = re.compile(r'[\W_]+')
+
+# CoverArtist -> how MusicBrainz credits the singer
+COVER_ARTISTS = {
+    "Neuro": "Neuro-sama",
+    "Evil": "Evil Neuro",
+}
+
+# typographic variants that aren't worth a correction
+TYPOGRAPHY = str.maketrans({
+    '\u2010': '-', '\u2011': '-', '\u2012': '-', '\u2013': '-', '\u2014': '-',
+    '\u2018': "'", '\u2019': "'", '\u201c': '"', '\u201d': '"', '\u2026': '...',
+})
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    title_key TEXT NOT NULL,
+    artist_key TEXT NOT NULL,
+    title TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    date TEXT NOT NULL,
+    mbid TEXT NOT NULL
+)
+"""
+
+
+class Recording(NamedTuple):
+    title: str
+    artist: str
+    date: str
+    mbid: str
+
+
+class Candidate(NamedTuple):
+    recording: Recording
+    score: float
+
+
+def fuzzy_key(text: str) -> str:
+
+    """
+    Key that survives the usual differences between the archive and MusicBrainz:
+    case, accents, width, punctuation, spacing and parenthesised suffixes like (feat. X) or (Remastered).
+    """
+
+    text = unicodedata.normalize('NFKD', str(text).casefold())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    stripped = PARENTHESES.sub('', text)
+    # a title that is only parentheses keeps them
+    text = stripped if NOT_ALPHANUMERIC.sub('', stripped) else text
+
+    return unicodedata.normalize('NFC', NOT_ALPHANUMERIC.sub('', text))
+
+def is_latin(text: str) -> bool:
+    return all(unicodedata.name(ch, '').startswith('LATIN') for ch in text if ch.isalpha())
+
+def _open_text(path: Path) -> IO[str]:
+
+    suffixes = path.suffixes
+    if suffixes[-1:] == ['.gz']:
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if suffixes[-1:] == ['.bz2']:
+        return bz2.open(path, 'rt', encoding='utf-8')
+    if suffixes[-1:] == ['.xz']:
+        return lzma.open(path, 'rt', encoding='utf-8')
+
+    return open(path, 'r', encoding='utf-8', newline='')
+
+def _iter_lines(path: Path) -> Iterator[str]:
+
+    """Lines of a dump, also looking inside tar archives (the MusicBrainz JSON dumps are .tar.xz)."""
+
+    if '.tar' in path.suffixes:
+        with tarfile.open(path, 'r|*') as archive:
+            for member in archive:
+                # the data is under mbdump/, the top level only has README, COPYING, TIMESTAMP...
+                if not member.isfile() or '/' not in member.name.strip('./'):
+                    continue
+                f = archive.extractfile(member)
+                if f is None:
+                    continue
+                for line in f:
+                    yield line.decode('utf-8')
+        return
+
+    with _open_text(path) as f:
+        yield from f
+
+def _artist_credit(credits: list[dict]) -> str:
+    # repository style: "Imagine Dragons, JID"
+    return ", ".join(credit.get("name") or credit.get("artist", {}).get("name", "") for credit in credits)
+
+def iter_json_dump(path: Path | str) -> Iterator[Recording]:
+
+    """Recordings from a JSON-lines dump, one recording object per line as in the MusicBrainz JSON dumps."""
+
+    for line in _iter_lines(Path(path)):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            logger.warning("Skipping a line that isn't valid JSON")
+            continue
+
+        title = data.get("title")
+        if not title:
+            continue
+
+        yield Recording(
+            title,
+            _artist_credit(data.get("artist-credit") or []),
+            data.get("first-release-date") or "",
+            data.get("id") or "",
+        )
+
+def iter_tsv_dump(path: Path | str) -> Iterator[Recording]:
+
+    """Recordings from a TSV with a header row naming the title, artist, date and (optional) mbid columns."""
+
+    reader = csv.DictReader(_iter_lines(Path(path)), delimiter='\t', quoting=csv.QUOTE_NONE)
+
+    for row in reader:
+        title = row.get("title") or row.get("name")
+        if not title:
+            continue
+
+        yield Recording(title, row.get("artist") or "", row.get("date") or "", row.get("mbid") or row.get("gid") or "")
+
+def iter_dump(path: Path | str) -> Iterator[Recording]:
+
+    path = Path(path)
+    if any(suffix in ('.tsv', '.csv') for suffix in path.suffixes):
+        return iter_tsv_dump(path)
+
+    return iter_json_dump(path)
+
+def build_index(recordings: Iterable[Recording], index_path: Path | str, batch_size: int = BATCH_SIZE) -> int:
+
+    """Stream recordings into an sqlite index, holding at most batch_size of them in memory."""
+
+    connection = sqlite3.connect(index_path)
+    count = 0
+
+    try:
+        connection.execute("DROP TABLE IF EXISTS recordings")
+        connection.execute(SCHEMA)
+
+        batch: list[tuple[str, ...]] = []
+        for recording in recordings:
+            batch.append((fuzzy_key(recording.title), fuzzy_key(recording.artist), *recording))
+
+            if len(batch) >= batch_size:
+                connection.executemany("INSERT INTO recordings VALUES (?, ?, ?, ?, ?, ?)", batch)
+                count += len(batch)
+                batch.clear()
+
+        connection.executemany("INSERT INTO recordings VALUES (?, ?, ?, ?, ?, ?)", batch)
+        count += len(batch)
+
+        # built after the inserts, much faster than keeping it up to date row by row
+        connection.execute("CREATE INDEX IF NOT EXISTS recordings_title ON recordings (title_key)")
+        connection.commit()
+
+    finally:
+        connection.close()
+
+    return count
+
+
+class MusicBrainzIndex:
+
+    def __init__(self, index_path: Path | str):
+        self.connection = sqlite3.connect(Path(index_path).resolve().as_uri() + "?mode=ro", uri=True)
+
+    def __enter__(self) -> "MusicBrainzIndex":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def lookup(self, title: str) -> list[Recording]:
+
+        rows = self.connection.execute(
+            "SELECT title, artist, date, mbid FROM recordings WHERE title_key = ?", (fuzzy_key(title),)
+        )
+        return [Recording(*row) for row in rows]
+
+    def candidates(self, titles: Iterable[str], artists: Iterable[str]) -> list[Candidate]:
+
+        """Recordings with the same title key as any of titles, and an artist close to one of artists."""
+
+        titles = set(titles)
+        artists = [fuzzy_key(artist) for artist in artists]
+        if not titles or not artists:
+            return []
+
+        candidates: list[Candidate] = []
+        for title in titles:
+            for recording in self.lookup(title):
+                artist_key = fuzzy_key(recording.artist)
+                score = max(SequenceMatcher(None, artist, artist_key).ratio() for artist in artists)
+
+                if score >= MIN_ARTIST_SCORE:
+                    candidates.append(Candidate(recording, score))
+
+        return candidates
+
+    def match_original(self, record: dict[str, str | int | float]) -> Candidate | None:
+
+        """The original song, to check Title, TitleOG, Artist and ArtistOG."""
+
+        candidates = self.candidates(_fields(record, "Title", "TitleOG"), _fields(record, "Artist", "ArtistOG"))
+        # best artist, then a full date, then the earliest date
+        return min(candidates, key=lambda c: (-round(c.score, 2), not FULL_DATE.match(c.recording.date), c.recording.date), default=None)
+
+    def match_cover(self, record: dict[str, str | int | float]) -> Candidate | None:
+
+        """
+        The cover itself, credited to Neuro / Evil. Only this one can say anything about Date.
+        A song is often covered several times, so it has to be dated within COVER_DATE_WINDOW of the record.
+        """
+
+        singers = [COVER_ARTISTS.get(singer.strip(), singer.strip()) for singer in str(record.get("CoverArtist", "")).split('&')]
+        record_date = _parse_date(str(record.get("Date", "")))
+        if record_date is None:
+            return None
+
+        candidates = self.candidates(_fields(record, "Title", "TitleOG"), [", ".join(singers)])
+        dated = [(abs((released - record_date).days), c) for c in candidates
+                 if (released := _parse_date(c.recording.date)) is not None]
+        dated = [(days, c) for days, c in dated if days <= COVER_DATE_WINDOW]
+
+        return min(dated, key=lambda item: (item[0], -item[1].score))[1] if dated else None
+
+
+def _fields(record: dict[str, str | int | float], *fields: str) -> list[str]:
+    return [str(record[field]) for field in fields if record.get(field)]
+
+def _parse_date(text: str) -> date | None:
+    try:
+        return date.fromisoformat(text) if FULL_DATE.match(text) else None
+    except ValueError:
+        return None
+
+def _plain(text: str) -> str:
+    return text.translate(TYPOGRAPHY)
+
+def propose_corrections(record: dict[str, str | int | float], original: Recording | None,
+                        cover: Recording | None = None) -> dict[str, tuple[str, str]]:
+
+    """
+    field -> (current, proposed) where the record and MusicBrainz disagree.
+    Title and Artist only get spelling fixes (same fuzzy key), a different key means another song or a translation.
+    Date is the date of the cover, so it's only checked against a recording of the cover.
+    """
+
+    corrections: dict[str, tuple[str, str]] = {}
+
+    if original is not None:
+        title_field = "Title" if is_latin(original.title) else "TitleOG"
+        artist_field = "Artist" if is_latin(original.artist) else "ArtistOG"
+
+        for field, proposed in ((title_field, original.title), (artist_field, original.artist)):
+            current = str(record.get(field) or "")
+            if current and _plain(current) != _plain(proposed) and fuzzy_key(current) == fuzzy_key(proposed):
+                corrections[field] = (current, proposed)
+            elif not current and field.endswith("OG"):
+                # the name is already in Title / Artist, the OG field is only for a different spelling
+                if fuzzy_key(proposed) != fuzzy_key(str(record.get(field.removesuffix("OG")) or "")):
+                    corrections[field] = (current, proposed)
+
+    if cover is not None:
+        current_date = str(record.get("Date") or "")
+        if FULL_DATE.match(cover.date) and cover.date != current_date:
+            corrections["Date"] = (current_date, cover.date)
+
+    return corrections
+
+def match_records(index: MusicBrainzIndex, records: Iterable[tuple[Path, dict[str, str | int | float]]]
+                  ) -> Iterator[tuple[Path, list[Recording], dict[str, tuple[str, str]]]]:
+
+    """(hjson path, matched recordings, corrections) for every record with something to propose."""
+
+    for path, record in records:
+        original = index.match_original(record)
+        cover = index.match_cover(record)
+
+        matched = [candidate.recording for candidate in (original, cover) if candidate is not None]
+        if not matched:
+            continue
+
+        corrections = propose_corrections(
+            record,
+            original.recording if original else None,
+            cover.recording if cover else None,
+        )
+        if corrections:
+            yield path, matched, corrections
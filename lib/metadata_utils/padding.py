@@ -0,0 +1,85 @@
+import io
+import logging
+
+from mutagen import PaddingInfo
+from mutagen.id3 import ID3
+
+logger = logging.getLogger(__name__)
+
+PADDING_STEP = 65_536 # padding only ever grows in whole steps
+TEXT_HEADROOM = 4_096 # longer titles, comments and payloads
+LYRICS_HEADROOM = 16_384 # USLT + SYLT of a typical song
+EXCESS_STEPS = 4 # padding beyond reserve + this many steps is given back
+
+
+def _round_up(value: int, step: int) -> int:
+    return -(-value // step) * step
+
+def expected_headroom(tags: ID3, image_size: int = 0) -> int:
+
+    """Bytes to keep free for the frames this song is still expected to get."""
+
+    headroom = TEXT_HEADROOM
+
+    if not (tags.getall("USLT") or tags.getall("SYLT")):
+        headroom += LYRICS_HEADROOM
+
+    if not tags.getall("APIC"):
+        headroom += image_size
+
+    return headroom
+
+
+class PaddingPolicy:
+
+    """
+    mutagen padding callback.
+    Keeps the current padding whenever the new frames fit, so the tag is rewritten in place.
+    Otherwise (tag grew, or padding became excessive) leaves `reserve` bytes free, rounded up to whole steps.
+    """
+
+    def __init__(self, reserve: int = TEXT_HEADROOM + LYRICS_HEADROOM, step: int = PADDING_STEP,
+                 max_padding: int | None = None):
+        self.reserve = reserve
+        self.step = step
+        self.max_padding = max_padding if max_padding is not None else _round_up(reserve, step) + EXCESS_STEPS * step
+
+    def fits(self, padding: int) -> bool:
+        return 0 <= padding <= self.max_padding
+
+    @property
+    def target(self) -> int:
+
+        """Padding left after a resize."""
+
+        return _round_up(max(self.reserve, 1), self.step)
+
+    def __call__(self, info: PaddingInfo) -> int:
+
+        if self.fits(info.padding):
+            return info.padding
+
+        new_padding = self.target
+        logger.debug(f"Resizing ID3 padding from {info.padding} to {new_padding}")
+        return new_padding
+
+
+def rendered_size(tags: ID3) -> int:
+
+    """Size the tag would take with no padding at all."""
+
+    buffer = io.BytesIO()
+    tags.save(buffer, v1=0, padding=lambda info: 0)
+    return len(buffer.getvalue())
+
+def current_size(tags: ID3) -> int:
+
+    """Space the tag takes in the file it was loaded from, 0 for new tags."""
+
+    return getattr(tags, "size", 0) or 0
+
+def needs_rewrite(tags: ID3, policy: PaddingPolicy) -> bool:
+
+    """Whether saving tags would resize the tag block and move the audio after it."""
+
+    return not policy.fits(current_size(tags) - rendered_size(tags))
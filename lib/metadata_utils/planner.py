@@ -0,0 +1,217 @@
+import copy
+import logging
+from collections import Counter
+from collections.abc import Iterable
+from pathlib import Path
+from typing import NamedTuple
+
+from mutagen import PaddingInfo
+from mutagen.id3 import ID3
+
+from .CF_Program import Song
+from .padding import current_size, rendered_size
+from .storage import ID3V1_SIZE
+from .sync import find_record
+
+logger = logging.getLogger(__name__)
+
+IN_PLACE = "in place" # only the tag block is rewritten
+REWRITE = "rewrite" # the tag block is resized, the audio after it moves
+RENAME = "rename"
+COPY = "copy" # the whole file is written again
+SKIP = "skip"
+
+
+class Operation(NamedTuple):
+    path: Path
+    action: str # save, rename, set_album_image, embed_lyrics, remux_song
+    mode: str
+    read: int # estimated bytes
+    written: int
+    note: str = ""
+
+    def __str__(self) -> str:
+        note = f" ({self.note})" if self.note else ""
+        return f"{self.action:<16} {self.mode:<9} read {_human(self.read):>9} written {_human(self.written):>9}  {self.path.name}{note}"
+
+
+class Plan:
+
+    def __init__(self, operations: list[Operation] | None = None):
+        self.operations = operations or []
+
+    @property
+    def read(self) -> int:
+        return sum(op.read for op in self.operations)
+
+    @property
+    def written(self) -> int:
+        return sum(op.written for op in self.operations)
+
+    @property
+    def rewrites(self) -> list[Path]:
+        return sorted({op.path for op in self.operations if op.mode in (REWRITE, COPY)})
+
+    def __str__(self) -> str:
+        counts = Counter((op.action, op.mode) for op in self.operations)
+        lines = [f"{action:<16} {mode:<9} x{count}" for (action, mode), count in sorted(counts.items())]
+        lines.append(f"{len(self.rewrites)} file(s) rewritten in full, {_human(self.read)} read, {_human(self.written)} written")
+        return "\n".join(lines)
+
+    def as_dict(self) -> dict:
+        return {
+            "read": self.read,
+            "written": self.written,
+            "operations": [dict(op._asdict(), path=str(op.path)) for op in self.operations],
+        }
+
+
+def _human(size: int) -> str:
+
+    value = float(size)
+    for unit in ("B", "KB", "MB"):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+
+    return f"{value:.1f} GB"
+
+
+class _PlannedFile:
+
+    """What a song's file would look like after the operations planned so far."""
+
+    def __init__(self, song: Song):
+        self.song = song
+        self.path = song.path
+        self.size = song.storage.info(song.path).size
+
+        try:
+            self.tags = song._load_id3()
+        except Exception:
+            self.tags = ID3()
+
+        self.tag_size = current_size(self.tags)
+
+    def write(self, action: str, read: int = 0, note: str = "") -> Operation:
+
+        """Estimate Song._write_tags on the current tags, then apply it to the planned file."""
+
+        read += self.tag_size + ID3V1_SIZE # _load_id3
+        written = 0
+
+        if self.song.atomic_writes:
+            # atomic_update copies the file before saving the copy
+            read += self.size
+            written += self.size
+
+        audio_size = self.size - self.tag_size
+        needed = rendered_size(self.tags)
+        policy = self.song.padding_policy(self.tags)
+        padding = self.tag_size - needed
+
+        if policy.fits(padding):
+            mode = IN_PLACE
+            new_size = self.tag_size
+            written += new_size
+        else:
+            mode = REWRITE
+            new_size = needed + policy(PaddingInfo(padding, audio_size))
+            # everything after the tag is moved to make room (or to give it back)
+            read += audio_size
+            written += new_size + audio_size
+
+        self.tag_size = new_size
+        self.size = audio_size + new_size
+
+        return Operation(self.path, action, mode, read, written, note)
+
+
+def plan_song(song: Song, record: dict[str, str | int | float] | None = None, album_image: bool = False,
+              lrc_path: Path | None = None, remux: bool = False) -> list[Operation]:
+
+    """
+    Operations a sync would run on one song, in order, with their estimated cost.
+    Only reads the song: the Song passed in isn't modified either.
+    """
+
+    song = copy.copy(song)
+    planned = _PlannedFile(song)
+    operations: list[Operation] = []
+
+    if record is not None:
+        song.load_hjson(record)
+        planned.tags = song._build_tags()
+        operations.append(planned.write("save"))
+
+        new_path = song.path.with_name(song.filename)
+        if new_path != song.path:
+            exists = song.storage.is_file(new_path)
+            operations.append(Operation(song.path, "rename", SKIP if exists else RENAME, 0, 0,
+                                        f"{new_path.name} already exists" if exists else new_path.name))
+            if not exists:
+                planned.path = new_path
+
+    if album_image:
+        cover = song.album_cover
+        if cover is None or not cover.is_file():
+            operations.append(Operation(planned.path, "set_album_image", SKIP, 0, 0, "no cover image"))
+        elif (frame := song._image_frame(cover)) is None:
+            operations.append(Operation(planned.path, "set_album_image", SKIP, 0, 0, f"unsupported image {cover.name}"))
+        else:
+            planned.tags.delall('APIC')
+            planned.tags.add(frame)
+            operations.append(planned.write("set_album_image", read=len(frame.data), note=cover.name))
+
+    if lrc_path is not None:
+        lyrics = Path(lrc_path).read_text(encoding='utf-8').strip()
+        lrc_size = Path(lrc_path).stat().st_size
+
+        if lyrics in song.embedded_lyrics():
+            operations.append(Operation(planned.path, "embed_lyrics", SKIP, planned.tag_size + lrc_size, 0, "already embedded"))
+        else:
+            song._add_lyrics(planned.tags, lyrics)
+            operations.append(planned.write("embed_lyrics", read=lrc_size, note=Path(lrc_path).name))
+
+    if remux:
+        operations.append(Operation(planned.path, "remux_song", COPY, planned.size, planned.size))
+
+    return operations
+
+def find_lyrics(song: Song, lyrics_folder: Path | str) -> Path | None:
+
+    """lrc named after the song, under its current or its new name."""
+
+    lyrics_folder = Path(lyrics_folder)
+    for stem in dict.fromkeys((song.path.stem, Path(song.filename).stem)):
+        for lrc_path in (lyrics_folder / song.path.parent.name / f"{stem}.lrc", lyrics_folder / f"{stem}.lrc"):
+            if lrc_path.is_file():
+                return lrc_path
+
+    return None
+
+def plan_library(songs: Iterable[Song], records: dict[str, dict[str, str | int | float]] | None = None,
+                 album_images: bool = False, lyrics_folder: Path | str | None = None, remux: bool = False) -> Plan:
+
+    """
+    Plan for a whole library. records are the hjson records by hash (see sync.load_records),
+    songs without one only get the other operations.
+    """
+
+    plan = Plan()
+
+    for song in songs:
+        record = None
+        if records is not None:
+            record = find_record(records, song)
+            if record is None:
+                plan.operations.append(Operation(song.path, "save", SKIP, 0, 0, "no record found"))
+
+        lrc_path = find_lyrics(song, lyrics_folder) if lyrics_folder is not None else None
+
+        try:
+            plan.operations += plan_song(song, record, album_images, lrc_path, remux)
+        except Exception as e:
+            print(f"Error processing {song.path}: {e}")
+
+    return plan
@@ -0,0 +1,207 @@
+import json
+import logging
+import struct
+import zipfile
+import zlib
+from pathlib import Path
+from typing import NamedTuple
+
+import hjson
+import xxhash
+
+logger = logging.getLogger(__name__)
+
+# every entry gets the same timestamp and permissions so the same records always give the same bytes
+ZIP_DATE = (1 << 5) | 1 # 1980-01-01, the earliest date a zip can hold
+ZIP_TIME = 0
+ZIP_VERSION = 20
+ZIP_MADE_BY = (3 << 8) | ZIP_VERSION # unix
+ZIP_EXTERNAL_ATTR = 0o100644 << 16
+ZIP_UTF8_FLAG = 0x800
+COMPRESS_LEVEL = 9
+
+LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+CENTRAL_HEADER = struct.Struct('<4s6H3L5H2L')
+END_OF_CENTRAL_DIRECTORY = struct.Struct('<4s4H2LH')
+
+
+class ReleaseEntry(NamedTuple):
+    name: str
+    digest: str # xxh64 of the uncompressed content
+    crc: int
+    size: int
+    method: int
+    raw: bytes # compressed data, as stored in the zip
+
+
+def collect_records(root: Path | str, pattern: str = '*.hjson') -> dict[str, bytes]:
+
+    """Archive name -> content of every record under root, sorted by name."""
+
+    root = Path(root)
+    records = {path.relative_to(root).as_posix(): path.read_bytes() for path in root.rglob(pattern) if path.is_file()}
+
+    return dict(sorted(records.items()))
+
+def _compress(data: bytes) -> bytes:
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+def make_entry(name: str, data: bytes) -> ReleaseEntry:
+
+    raw = _compress(data)
+    method = zipfile.ZIP_DEFLATED
+    if len(raw) >= len(data):
+        raw, method = data, zipfile.ZIP_STORED
+
+    return ReleaseEntry(name, xxhash.xxh64(data).hexdigest(), zlib.crc32(data), len(data), method, raw)
+
+def read_release(path: Path | str) -> dict[str, ReleaseEntry]:
+
+    """Entries of a previous release, with their compressed bytes so they can be copied as is."""
+
+    entries: dict[str, ReleaseEntry] = {}
+
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+
+            f.seek(info.header_offset)
+            header = LOCAL_HEADER.unpack(f.read(LOCAL_HEADER.size))
+            f.seek(header[9] + header[10], 1) # skip the name and extra field
+            raw = f.read(info.compress_size)
+
+            data = archive.read(info)
+            entries[info.filename] = ReleaseEntry(
+                info.filename, xxhash.xxh64(data).hexdigest(), info.CRC, info.file_size, info.compress_type, raw
+            )
+
+    return entries
+
+def write_release(output: Path | str, entries: list[ReleaseEntry]) -> None:
+
+    """Write a zip with sorted entries and fixed metadata, byte for byte reproducible."""
+
+    central = bytearray()
+
+    with open(output, 'wb') as f:
+        for entry in sorted(entries, key=lambda e: e.name):
+            name = entry.name.encode('utf-8')
+            flags = 0 if name.isascii() else ZIP_UTF8_FLAG
+            offset = f.tell()
+
+            f.write(LOCAL_HEADER.pack(
+                b'PK\x03\x04', ZIP_VERSION, flags, entry.method, ZIP_TIME, ZIP_DATE,
+                entry.crc, len(entry.raw), entry.size, len(name), 0
+            ))
+            f.write(name)
+            f.write(entry.raw)
+
+            central += CENTRAL_HEADER.pack(
+                b'PK\x01\x02', ZIP_MADE_BY, ZIP_VERSION, flags, entry.method, ZIP_TIME, ZIP_DATE,
+                entry.crc, len(entry.raw), entry.size, len(name), 0, 0, 0, 0, ZIP_EXTERNAL_ATTR, offset
+            )
+            central += name
+
+        central_offset = f.tell()
+        f.write(central)
+        f.write(END_OF_CENTRAL_DIRECTORY.pack(
+            b'PK\x05\x06', 0, 0, len(entries), len(entries), len(central), central_offset, 0
+        ))
+
+def build_release(records: dict[str, bytes], output: Path | str,
+                  previous: dict[str, ReleaseEntry] | None = None) -> tuple[int, int]:
+
+    """
+    Write the release zip, copying the compressed data of any record whose content is unchanged
+    since the previous release (even if it was renamed). Returns (reused, compressed).
+    """
+
+    by_digest = {entry.digest: entry for entry in (previous or {}).values()}
+    entries: list[ReleaseEntry] = []
+    reused = 0
+
+    for name, data in records.items():
+        digest = xxhash.xxh64(data).hexdigest()
+        old = by_digest.get(digest)
+
+        if old is not None and old.size == len(data) and old.crc == zlib.crc32(data):
+            entries.append(old._replace(name=name))
+            reused += 1
+        else:
+            entries.append(make_entry(name, data))
+
+    write_release(output, entries)
+    return reused, len(entries) - reused
+
+def _record_key(data: bytes) -> str:
+
+    """Identity of a record across renames, its audio hash."""
+
+    try:
+        return str(hjson.loads(data.decode('utf-8')).get("xxHash", ""))
+    except Exception:
+        return ""
+
+def make_delta(previous: dict[str, ReleaseEntry], records: dict[str, bytes]) -> dict[str, list]:
+
+    """
+    Added, changed, removed and renamed records between the previous release and the new one.
+    A rename is a removed and an added record with the same content or the same xxHash.
+    """
+
+    digests = {name: xxhash.xxh64(data).hexdigest() for name, data in records.items()}
+
+    added = [name for name in records if name not in previous]
+    removed = [name for name in previous if name not in records]
+    changed = [name for name in records if name in previous and previous[name].digest != digests[name]]
+
+    renamed: list[dict[str, str | bool]] = []
+    removed_by_digest = {previous[name].digest: name for name in removed}
+    removed_by_key: dict[str, str] = {}
+    for name in removed:
+        data = zlib.decompress(previous[name].raw, -15) if previous[name].method == zipfile.ZIP_DEFLATED else previous[name].raw
+        if key := _record_key(data):
+            removed_by_key[key] = name
+
+    for name in list(added):
+        source = removed_by_digest.get(digests[name])
+        same_content = source is not None
+        if source is None:
+            source = removed_by_key.get(_record_key(records[name]))
+
+        if source is None or source not in removed:
+            continue
+
+        renamed.append({"from": source, "to": name, "changed": not same_content})
+        added.remove(name)
+        removed.remove(source)
+
+    return {
+        "added": added,
+        "changed": changed,
+        "removed": removed,
+        "renamed": renamed,
+        "digests": {name: digests[name] for name in added + changed + [r["to"] for r in renamed]},
+    }
+
+def write_delta(output: Path | str, delta: dict[str, list]) -> None:
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(delta, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+def apply_delta(release: Path | str, delta: dict[str, list], target: Path | str) -> None:
+
+    """Update an unpacked copy of the previous release, extracting only what the delta lists."""
+
+    target = Path(target)
+
+    with zipfile.ZipFile(release) as archive:
+        for item in delta["renamed"]:
+            (target / item["from"]).unlink(missing_ok=True)
+
+        for name in delta["removed"]:
+            (target / name).unlink(missing_ok=True)
+
+        for name in delta["added"] + delta["changed"] + [item["to"] for item in delta["renamed"]]:
+            archive.extract(name, target)
@@ -1,16 +1,17 @@
 import logging
-import os
 import subprocess
 import sys
 from pathlib import Path
 
+from .journal import commit_temp, temp_path_for
+
 logger = logging.getLogger(__name__)
 
 
 def remux_song(file_path: Path, new_path: Path) -> None:
 
-    if file_path == new_path:
-        os.rename(file_path, "temp")
+    # ffmpeg writes next to the destination, the result only replaces new_path once it's complete
+    temp_path = temp_path_for(Path(new_path))
 
     if sys.platform == "win32":
         # Windows-specific flag to hide the console
@@ -27,7 +28,8 @@ def remux_song(file_path: Path, new_path: Path) -> None:
                 "-map_metadata", "0", 
                 "-c:a", "copy",
                 "-write_xing", "1",
-                new_path
+                "-f", "mp3", # the temp name doesn't end in .mp3
+                temp_path
             ],
             shell=False,
             capture_output=True, 
@@ -37,11 +39,14 @@ def remux_song(file_path: Path, new_path: Path) -> None:
         )
         if result.returncode != 0:
             logger.critical(f"ffmpeg encountered an issue. Stderr: {result.stderr}")
+            temp_path.unlink(missing_ok=True)
+            return
+
+        commit_temp(temp_path, Path(new_path))
             
     except Exception as e:
         logger.exception(e)
+        temp_path.unlink(missing_ok=True)
 
     else:
         logger.debug("Remuxing process run succesufully")
-        if file_path == new_path:
-            os.remove("temp")
@@ -0,0 +1,174 @@
+import bisect
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+
+import hjson
+
+logger = logging.getLogger(__name__)
+
+# query field -> hjson fields it covers
+TEXT_FIELDS = {
+    "title": ("Title", "TitleOG"),
+    "artist": ("Artist", "ArtistOG"),
+    "cover": ("CoverArtist",),
+}
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def normalize(text: str) -> str:
+
+    """NFC like sanitize_filename, then casefold so 'Neuro' and 'NEURO' match."""
+
+    return unicodedata.normalize('NFC', unicodedata.normalize('NFC', str(text)).casefold())
+
+def tokenize(text: str) -> list[str]:
+    return WORD_PATTERN.findall(normalize(text))
+
+
+class CatalogIndex:
+
+    """
+    Inverted indexes over the hjson records.
+    Text fields are indexed by word and by their whole value, dates and discs by value.
+    """
+
+    def __init__(self):
+        self.paths: list[Path] = []
+        self.records: list[dict[str, str]] = []
+        self.terms: dict[str, defaultdict[str, set[int]]] = {field: defaultdict(set) for field in TEXT_FIELDS}
+        self.sorted_terms: dict[str, list[str]] = {}
+        self.discs: defaultdict[str, set[int]] = defaultdict(set)
+        self.dates: list[tuple[str, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add(self, path: Path, record: dict[str, str | int | float]) -> int:
+
+        record_id = len(self.records)
+        record = {key: str(value) for key, value in record.items()}
+        self.paths.append(path)
+        self.records.append(record)
+
+        for field, sources in TEXT_FIELDS.items():
+            terms = self.terms[field]
+
+            for source in sources:
+                value = record.get(source)
+                if not value:
+                    continue
+
+                values = value.split('&') if source == "CoverArtist" else [value]
+                for value in values:
+                    terms[normalize(value.strip())].add(record_id)
+                    for token in tokenize(value):
+                        terms[token].add(record_id)
+
+        self.discs[record.get("Discnumber", "")].add(record_id)
+        self.dates.append((record.get("Date", ""), record_id))
+
+        return record_id
+
+    def finalize(self) -> None:
+
+        """Sort keys and dates for prefix and range queries, call after the last add()."""
+
+        self.sorted_terms = {field: sorted(terms) for field, terms in self.terms.items()}
+        self.dates.sort()
+
+    @classmethod
+    def from_folder(cls, root: Path | str) -> "CatalogIndex":
+
+        index = cls()
+
+        for path in sorted(Path(root).rglob('*.hjson')):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    index.add(path, hjson.load(f))
+            except Exception as e:
+                print(f"Error processing {path}: {e}")
+
+        index.finalize()
+        return index
+
+    def match(self, field: str, text: str) -> set[int]:
+
+        """Records whose field contains every word of text."""
+
+        terms = self.terms[field]
+        tokens = tokenize(text)
+        key = normalize(text.strip())
+
+        result: set[int] = set()
+        if tokens:
+            result = set(terms.get(tokens[0], ()))
+            for token in tokens[1:]:
+                result &= terms.get(token, set())
+                if not result:
+                    break
+
+        # the whole value adds the records whose value has no words to split (symbols only, for example)
+        return result | terms.get(key, set())
+
+    def prefix(self, field: str, text: str) -> set[int]:
+
+        """Records with a word, or a whole value, of field starting with text."""
+
+        key = normalize(text.strip())
+        keys = self.sorted_terms[field]
+        terms = self.terms[field]
+
+        result: set[int] = set()
+        for i in range(bisect.bisect_left(keys, key), len(keys)):
+            if not keys[i].startswith(key):
+                break
+            result |= terms[keys[i]]
+
+        return result
+
+    def date_range(self, start: str = "", end: str = "") -> set[int]:
+
+        """Records dated between start and end, inclusive. Partial dates work: '2024' to '2024-06'."""
+
+        low = bisect.bisect_left(self.dates, (start, -1))
+        high = bisect.bisect_right(self.dates, (end + '\uffff', -1)) if end else len(self.dates)
+
+        return {record_id for _, record_id in self.dates[low:high]}
+
+    def disc(self, discnumber: str | int) -> set[int]:
+        return set(self.discs.get(str(discnumber), ()))
+
+    def search(self, title: str = "", artist: str = "", cover: str = "", disc: str | int = "",
+               date_from: str = "", date_to: str = "", duet: bool | None = None, prefix: bool = False) -> list[int]:
+
+        """Intersection of every given filter, ordered like the archive."""
+
+        lookup = self.prefix if prefix else self.match
+        filters: list[set[int]] = []
+
+        for field, text in (("title", title), ("artist", artist), ("cover", cover)):
+            if text:
+                filters.append(lookup(field, text))
+
+        if disc:
+            filters.append(self.disc(disc))
+
+        if date_from or date_to:
+            filters.append(self.date_range(date_from, date_to))
+
+        if not filters:
+            result = set(range(len(self.records)))
+        else:
+            filters.sort(key=len)
+            result = filters[0]
+            for other in filters[1:]:
+                result = result & other
+
+        if duet is not None:
+            result = {i for i in result if ('&' in self.records[i].get("CoverArtist", "")) == duet}
+
+        return sorted(result)
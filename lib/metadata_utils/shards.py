@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import socket
+from collections import defaultdict
+from pathlib import Path
+
+import xxhash
+
+from .CF_Program import Song
+from .data_verification import ValidationError, validate_payload
+from .export import FAILED, export_song
+from .journal import commit_temp, temp_path_for
+from .storage import LOCAL_STORAGE, Storage
+from .sync import find_record, load_records, validation_payload
+
+logger = logging.getLogger(__name__)
+
+BY_DISC = "disc"
+BY_HASH = "hash"
+TASKS = ("hash", "validate", "retag", "export")
+
+
+def shard_of(relative_path: str, count: int, by: str, folders: list[str]) -> int:
+
+    """
+    Shard a song belongs to.
+    disc: whole DISC folders, dealt round robin in name order.
+    hash: xxh64 of the path relative to the library, spreads evenly whatever the folders look like.
+    """
+
+    if by == BY_DISC:
+        folder = relative_path.split('/')[0] if '/' in relative_path else ""
+        return folders.index(folder) % count
+
+    return xxhash.xxh64(relative_path.encode('utf-8')).intdigest() % count
+
+def list_shard(library: Path | str, index: int, count: int, by: str = BY_DISC,
+               storage: Storage | None = None) -> list[Path]:
+
+    storage = storage or LOCAL_STORAGE
+    library = Path(library)
+
+    paths = storage.scan(library, '.mp3')
+    relative = [path.relative_to(library).as_posix() for path in paths]
+    folders = sorted({rel.split('/')[0] if '/' in rel else "" for rel in relative})
+
+    return [path for path, rel in zip(paths, relative) if shard_of(rel, count, by, folders) == index]
+
+def process_shard(library: Path | str, index: int, count: int, by: str = BY_DISC, tasks: tuple[str, ...] = ("hash", "validate"),
+                  root: Path | str | None = None, storage: Storage | None = None) -> dict:
+
+    """
+    Run tasks over one shard and return its manifest.
+    retag and export need root, the folder with the DISC folders.
+    """
+
+    storage = storage or LOCAL_STORAGE
+    library = Path(library)
+    records = load_records(root) if root is not None and "retag" in tasks else {}
+
+    def process(path: Path) -> dict:
+
+        entry: dict = {"path": path.relative_to(library).as_posix(), "errors": []}
+
+        try:
+            song = Song(path, storage=storage)
+
+            if "hash" in tasks:
+                entry["hash"] = song.get_hash()
+                if song.xxHash and entry["hash"] and song.xxHash != entry["hash"]:
+                    entry["errors"].append(f"Tags say {song.xxHash}, the audio hashes to {entry['hash']}")
+
+            if "retag" in tasks:
+                metadata = find_record(records, song)
+                if metadata is None:
+                    entry["errors"].append("No record found")
+                else:
+                    song.load_hjson(metadata)
+                    song.save()
+                    entry["retagged"] = True
+
+            if "validate" in tasks:
+                try:
+                    validate_payload(validation_payload(song))
+                except ValidationError as e:
+                    entry["errors"].append(str(e))
+
+            if "export" in tasks and root is not None:
+                status, _ = export_song(song, Path(root))
+                entry["export"] = status
+                if status == FAILED:
+                    entry["errors"].append("Export failed")
+
+            entry["path"] = song.path.relative_to(library).as_posix()
+            entry["xxHash"] = song.xxHash
+            entry["disc"] = song.Discnumber
+            entry["track"] = song.Track
+
+        except Exception as e:
+            entry["errors"].append(f"{type(e).__name__}: {e}")
+
+        return entry
+
+    songs = storage.map(process, list_shard(library, index, count, by, storage))
+
+    return {
+        "shard": index,
+        "count": count,
+        "by": by,
+        "tasks": list(tasks),
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        "songs": songs,
+    }
+
+def manifest_name(index: int, count: int) -> str:
+    return f"shard-{index:03d}-of-{count:03d}.json"
+
+def write_manifest(folder: Path | str, manifest: dict) -> Path:
+
+    """Written through a temp file so a merge, maybe on another machine, never reads half a manifest."""
+
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / manifest_name(manifest["shard"], manifest["count"])
+    temp = temp_path_for(path)
+
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    commit_temp(temp, path)
+
+    return path
+
+def _track_number(track: str) -> str:
+    return track.split('/')[0].lstrip('0') if track else ""
+
+def merge_manifests(manifests: list[dict]) -> dict:
+
+    """
+    Combine shard manifests and look for conflicts:
+    missing or repeated shards, songs seen twice, the same audio hash on two songs,
+    and two songs with the same disc and track number.
+    """
+
+    conflicts: list[dict] = []
+    songs: list[dict] = []
+
+    counts = {manifest["count"] for manifest in manifests}
+    if len(counts) > 1:
+        conflicts.append({"type": "shard count", "counts": sorted(counts)})
+
+    seen_shards = defaultdict(int)
+    for manifest in manifests:
+        seen_shards[manifest["shard"]] += 1
+        songs += [dict(song, shard=manifest["shard"]) for song in manifest["songs"]]
+
+    if counts:
+        expected = range(max(counts))
+        missing = [i for i in expected if i not in seen_shards]
+        repeated = [i for i, n in seen_shards.items() if n > 1]
+        if missing:
+            conflicts.append({"type": "missing shards", "shards": missing})
+        if repeated:
+            conflicts.append({"type": "repeated shards", "shards": repeated})
+
+    by_path: defaultdict[str, list[dict]] = defaultdict(list)
+    by_hash: defaultdict[str, list[dict]] = defaultdict(list)
+    by_track: defaultdict[tuple[str, str], list[dict]] = defaultdict(list)
+
+    for song in songs:
+        by_path[song["path"]].append(song)
+        if xxhash_value := (song.get("hash") or song.get("xxHash")):
+            by_hash[xxhash_value].append(song)
+        if song.get("disc") and (number := _track_number(song.get("track", ""))):
+            by_track[(song["disc"], number)].append(song)
+
+    def add(kind: str, key: str, group: list[dict]) -> None:
+        conflicts.append({
+            "type": kind,
+            "key": key,
+            "paths": [song["path"] for song in group],
+            "shards": sorted({song["shard"] for song in group}),
+        })
+
+    for path, group in by_path.items():
+        if len(group) > 1:
+            add("duplicate path", path, group)
+
+    for value, group in by_hash.items():
+        if len({song["path"] for song in group}) > 1:
+            add("duplicate hash", value, group)
+
+    for (disc, number), group in by_track.items():
+        if len({song["path"] for song in group}) > 1:
+            add("duplicate track", f"disc {disc} track {number}", group)
+
+    return {
+        "shards": len(manifests),
+        "songs": sorted(songs, key=lambda song: song["path"]),
+        "errors": [song for song in songs if song["errors"]],
+        "conflicts": conflicts,
+    }
+
+def manifest_paths(folder: Path | str) -> list[Path]:
+    return sorted(Path(folder).glob("shard-*-of-*.json"))
+
+def load_manifests(folder: Path | str, count: int | None = None) -> list[dict]:
+
+    """
+    Manifests of one run: those split into count shards,
+    by default the count of the most recently written manifest, older runs are ignored.
+    """
+
+    paths = manifest_paths(folder)
+    if count is None and paths:
+        newest = max(paths, key=lambda path: path.stat().st_mtime)
+        count = int(newest.stem.rsplit('-', 1)[1])
+
+    manifests = []
+    for path in paths:
+        if count is not None and not path.stem.endswith(f"-of-{count:03d}"):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            manifests.append(json.load(f))
+
+    return manifests
+
+def clear_manifests(folder: Path | str) -> None:
+    for path in manifest_paths(folder):
+        path.unlink()
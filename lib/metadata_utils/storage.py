@@ -0,0 +1,385 @@
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 8
+TAG_READ_AHEAD = 131_072 # first read of a file, covers the ID3v2 tag of most songs
+BLOCK_SIZE = 65_536 # smallest read done on a cache miss
+ID3V1_SIZE = 128
+HASH_TAIL_SIZE = 1_000_000 + 987 + ID3V1_SIZE # everything get_audio_hash looks at
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class FileInfo(NamedTuple):
+    is_dir: bool
+    size: int
+    mtime: float
+
+
+class LocalFS:
+
+    """Plain filesystem access. Every method is one round trip on a network mount."""
+
+    def listdir(self, directory: Path) -> dict[Path, FileInfo]:
+
+        infos: dict[Path, FileInfo] = {}
+
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                # like rglob: broken links are skipped, and links to folders aren't walked into (they can loop)
+                try:
+                    if entry.is_symlink() and entry.is_dir():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+
+                infos[Path(entry.path)] = FileInfo(entry.is_dir(follow_symlinks=False), st.st_size, st.st_mtime)
+
+        return infos
+
+    def stat(self, path: Path) -> FileInfo | None:
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+
+        return FileInfo(path.is_dir(), st.st_size, st.st_mtime)
+
+    def read_range(self, path: Path, offset: int, size: int) -> bytes:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return f.read(size)
+
+    def rename(self, src: Path, dst: Path) -> None:
+        os.rename(src, dst)
+
+
+class LatencyFS(LocalFS):
+
+    """Local stand-in for a network mount, every call waits `latency` seconds (and `size / bandwidth` for reads)."""
+
+    def __init__(self, latency: float = 0.05, bandwidth: float | None = None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.round_trips = 0
+        self._lock = threading.Lock()
+
+    def _round_trip(self, size: int = 0) -> None:
+        with self._lock:
+            self.round_trips += 1
+
+        delay = self.latency
+        if self.bandwidth:
+            delay += size / self.bandwidth
+        time.sleep(delay)
+
+    def listdir(self, directory: Path) -> dict[Path, FileInfo]:
+        self._round_trip()
+        return super().listdir(directory)
+
+    def stat(self, path: Path) -> FileInfo | None:
+        self._round_trip()
+        return super().stat(path)
+
+    def read_range(self, path: Path, offset: int, size: int) -> bytes:
+        self._round_trip(size)
+        return super().read_range(path, offset, size)
+
+    def rename(self, src: Path, dst: Path) -> None:
+        self._round_trip()
+        super().rename(src, dst)
+
+
+class CachedFile:
+
+    """
+    Read-only file object served from prefetched byte ranges.
+    Misses go back to the filesystem in blocks of at least BLOCK_SIZE.
+    Can also be sliced like bytes, with offsets of the whole file.
+    """
+
+    def __init__(self, fs: LocalFS, path: Path, size: int):
+        self.fs = fs
+        self.path = path
+        self.name = str(path)
+        self.size = size
+        self.position = 0
+        self.segments: list[tuple[int, bytes]] = []
+
+    def __enter__(self) -> "CachedFile":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, key: int | slice) -> int | bytes:
+
+        if isinstance(key, int):
+            if key < 0:
+                key += self.size
+            if not 0 <= key < self.size:
+                raise IndexError("CachedFile index out of range")
+            return self.read_at(key, 1)[0]
+
+        start, stop, step = key.indices(self.size)
+        if step != 1:
+            raise ValueError("CachedFile slices don't support steps")
+
+        return self.read_at(start, stop - start)
+
+    def find(self, sub: bytes, start: int = 0, end: int | None = None) -> int:
+
+        start, end, _ = slice(start, end).indices(self.size)
+        index = self.read_at(start, end - start).find(sub)
+
+        return index if index == -1 else start + index
+
+    def _segment_at(self, offset: int) -> tuple[int, bytes] | None:
+
+        best = None
+        for segment in self.segments:
+            segment_offset, data = segment
+            if segment_offset <= offset < segment_offset + len(data):
+                if best is None or segment_offset + len(data) > best[0] + len(best[1]):
+                    best = segment
+
+        return best
+
+    def prefetch(self, offset: int, size: int) -> None:
+
+        offset = max(0, offset)
+        size = min(size, self.size - offset)
+        if size <= 0:
+            return
+
+        self.segments.append((offset, self.fs.read_range(self.path, offset, size)))
+
+    def read_at(self, offset: int, size: int) -> bytes:
+
+        end = min(offset + max(size, 0), self.size)
+        position = offset
+        out = bytearray()
+
+        while position < end:
+            segment = self._segment_at(position)
+
+            if segment is None:
+                data = self.fs.read_range(self.path, position, max(end - position, BLOCK_SIZE))
+                if not data:
+                    break
+                segment = (position, data)
+                self.segments.append(segment)
+
+            segment_offset, data = segment
+            chunk = data[position - segment_offset:end - segment_offset]
+            out += chunk
+            position += len(chunk)
+
+        return bytes(out)
+
+    def read(self, size: int = -1) -> bytes:
+
+        if size is None or size < 0:
+            size = self.size - self.position
+
+        data = self.read_at(self.position, size)
+        self.position += len(data)
+
+        return data
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.size
+
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return False
+
+    def close(self) -> None:
+        self.segments.clear()
+
+
+class Storage:
+
+    """
+    I/O layer used by Song.
+    batch_stats: answer exists / is_dir / size from one listing per directory instead of one stat per file.
+    concurrency: worker threads used by scan() and map().
+    read_ahead: bytes fetched from the start of a file when it's opened, 0 to disable.
+    """
+
+    def __init__(self, fs: LocalFS | None = None, concurrency: int = DEFAULT_CONCURRENCY,
+                 read_ahead: int = TAG_READ_AHEAD, batch_stats: bool = False):
+        self.fs = fs or LocalFS()
+        self.concurrency = max(1, concurrency)
+        self.read_ahead = read_ahead
+        self.batch_stats = batch_stats
+        self._infos: dict[Path, FileInfo] = {}
+        self._listed: set[Path] = set()
+        self._lock = threading.Lock()
+
+    def _list(self, directory: Path) -> dict[Path, FileInfo]:
+
+        infos = self.fs.listdir(directory)
+
+        if self.batch_stats:
+            with self._lock:
+                self._infos.update(infos)
+                self._listed.add(directory)
+
+        return infos
+
+    def info(self, path: Path | str) -> FileInfo | None:
+
+        path = Path(path)
+
+        if not self.batch_stats:
+            return self.fs.stat(path)
+
+        if path in self._infos:
+            return self._infos[path]
+
+        if path.parent in self._listed:
+            return None
+
+        try:
+            self._list(path.parent)
+        except FileNotFoundError:
+            return None
+
+        return self._infos.get(path)
+
+    def exists(self, path: Path | str) -> bool:
+        return self.info(path) is not None
+
+    def is_file(self, path: Path | str) -> bool:
+        info = self.info(path)
+        return info is not None and not info.is_dir
+
+    def is_dir(self, path: Path | str) -> bool:
+        info = self.info(path)
+        return info is not None and info.is_dir
+
+    def invalidate(self, path: Path | str) -> None:
+
+        """Refresh a cached entry after the file was written."""
+
+        if not self.batch_stats:
+            return
+
+        path = Path(path)
+        info = self.fs.stat(path)
+
+        with self._lock:
+            if info is None:
+                self._infos.pop(path, None)
+            else:
+                self._infos[path] = info
+
+    def rename(self, src: Path | str, dst: Path | str) -> None:
+
+        src, dst = Path(src), Path(dst)
+        self.fs.rename(src, dst)
+
+        if self.batch_stats:
+            with self._lock:
+                info = self._infos.pop(src, None)
+                if info is not None:
+                    self._infos[dst] = info
+
+    def open(self, path: Path | str, head: int | None = None, tail: int = 0) -> CachedFile:
+
+        """
+        Open a file for reading, fetching `head` bytes from the start (read_ahead by default)
+        and `tail` bytes from the end up front.
+        """
+
+        path = Path(path)
+        info = self.info(path)
+        if info is None or info.is_dir:
+            raise FileNotFoundError(f"Invalid path: {path}")
+
+        f = CachedFile(self.fs, path, info.size)
+        head = self.read_ahead if head is None else head
+
+        if head + tail >= info.size:
+            f.prefetch(0, info.size)
+            return f
+
+        if head:
+            f.prefetch(0, head)
+            # the ID3v2 tag is bigger than the read-ahead, fetch the rest of it in one go
+            header = f.segments[-1][1][:10]
+            if header[:3] == b'ID3' and len(header) == 10:
+                tag_size = 10 + ((header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9])
+                if tag_size > head:
+                    f.prefetch(head, tag_size - head)
+
+        if tail:
+            f.prefetch(info.size - tail, tail)
+
+        return f
+
+    def map(self, function: Callable[[T], R], items: Iterable[T]) -> list[R]:
+
+        """Run function over items with up to `concurrency` threads, keeping the order."""
+
+        items = list(items)
+        if self.concurrency == 1 or len(items) < 2:
+            return [function(item) for item in items]
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            return list(pool.map(function, items))
+
+    def scan(self, directory: Path | str, suffix: str = '.mp3') -> list[Path]:
+
+        """All files ending in suffix under directory, listing each level of folders concurrently."""
+
+        files: list[Path] = []
+        pending = [Path(directory)]
+
+        while pending:
+            listings = self.map(self._list, pending)
+            pending = []
+
+            for infos in listings:
+                for path, info in infos.items():
+                    # hidden: temp files of an interrupted write, .git...
+                    if path.name.startswith('.'):
+                        continue
+                    if info.is_dir:
+                        pending.append(path)
+                    elif path.suffix == suffix:
+                        files.append(path)
+
+        return sorted(files)
+
+
+LOCAL_STORAGE = Storage()
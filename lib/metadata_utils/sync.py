@@ -0,0 +1,240 @@
+import logging
+import time
+from pathlib import Path
+from typing import cast
+
+import hjson
+
+from .CF_Program import Song, get_all_mp3_as_obj
+from .data_verification import ValidationError, validate_payload
+from .hashing import DEFAULT_SCHEME, LEGACY, hash_key
+from .storage import Storage
+
+logger = logging.getLogger(__name__)
+
+OWN_WRITE_WINDOW = 2.0 # seconds during which events caused by our own writes are ignored
+
+
+def load_record(path: Path | str) -> (dict[str, str | int | float] | None):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return cast(dict[str, (str | int | float)], hjson.load(f))
+    except Exception as e:
+        print(f"Error processing {path}: {e}")
+        return None
+
+def load_records(root: Path | str) -> dict[str, dict[str, str | int | float]]:
+
+    """hjson records of the repository by xxHash, and by AudioHash for the records that have one."""
+
+    records: dict[str, dict[str, str | int | float]] = {}
+
+    for path in Path(root).rglob('*.hjson'):
+        metadata = load_record(path)
+        if not metadata:
+            continue
+
+        for field in ("xxHash", "AudioHash"):
+            if value := metadata.get(field):
+                records[hash_key(str(value))] = metadata
+
+    return records
+
+def find_record(records: dict[str, dict[str, str | int | float]], song: Song) -> (dict[str, str | int | float] | None):
+
+    """Record of a song by any of its hashes, hashing the audio only when the tags have none."""
+
+    for value in song.identities or tuple(filter(None, [song.get_hash()])):
+        if (metadata := records.get(hash_key(value))) is not None:
+            return metadata
+
+    return None
+
+def validation_payload(song: Song) -> dict[str, str]:
+    return {
+        "disc_number": song.Discnumber,
+        "track": song.Track,
+        "date": song.Date,
+        "version": song.Version,
+        "cover_artist": song.CoverArtist,
+        "special": song.Special,
+    }
+
+
+class LibrarySync:
+
+    """Keeps an mp3 library in line with the hjson records, one changed file at a time."""
+
+    def __init__(self, root: Path | str, library: Path | str, storage: Storage | None = None):
+        self.root = Path(root)
+        self.library = Path(library)
+        self.storage = storage
+        self.songs: dict[str, Path] = {} # xxHash and AudioHash -> mp3
+        self._own_writes: dict[Path, float] = {}
+
+    def build(self) -> None:
+
+        for song in get_all_mp3_as_obj(self.library, storage=self.storage):
+            for value in song.identities or tuple(filter(None, [song.get_hash()])):
+                self.songs[hash_key(value)] = song.path
+
+        print(f"Tracking {len(self.songs)} songs in {self.library}")
+
+    def _is_own_write(self, path: Path) -> bool:
+
+        now = time.monotonic()
+        self._own_writes = {p: until for p, until in self._own_writes.items() if until > now}
+
+        return path in self._own_writes
+
+    def _mark_own_write(self, *paths: Path) -> None:
+        for path in paths:
+            self._own_writes[path] = time.monotonic() + OWN_WRITE_WINDOW
+
+    def handle(self, batch: dict[Path, str]) -> None:
+
+        if "rescan" in batch.values():
+            self.rescan()
+
+        for path, kind in batch.items():
+            try:
+                if path.suffix == '.hjson' and kind == "changed":
+                    self.record_changed(path)
+                elif path.suffix == '.mp3' and kind == "changed":
+                    self.song_changed(path)
+                elif path.suffix == '.mp3' and kind == "removed":
+                    self.song_removed(path)
+            except Exception as e:
+                print(f"Error processing {path}: {e}")
+
+    def rescan(self) -> None:
+
+        """Events were lost: map the library again and re-check every record (unchanged ones cost a tag read)."""
+
+        self.songs = {}
+        self.build()
+
+        for path in sorted(self.root.rglob('*.hjson')):
+            try:
+                self.record_changed(path)
+            except Exception as e:
+                print(f"Error processing {path}: {e}")
+
+    def record_changed(self, path: Path) -> None:
+
+        """Edited record: load_hjson -> set_tags -> rename on the matching mp3."""
+
+        metadata = load_record(path)
+        if not metadata:
+            return
+
+        keys = [hash_key(str(value)) for field in ("xxHash", "AudioHash") if (value := metadata.get(field))]
+        song_path = next((self.songs[key] for key in keys if key in self.songs), None)
+        if song_path is None:
+            print(f"No mp3 found for {path.name}")
+            return
+
+        song = Song(song_path, storage=self.storage)
+        if song.build_payload() == _payload_after(song, metadata):
+            return
+
+        song.load_hjson(metadata)
+        self._mark_own_write(song.path)
+        song.save()
+        self._mark_own_write(song.path)
+        for key in keys:
+            self.songs[key] = song.path
+
+        print(f"Synced {path.name} -> {song.path.name}")
+
+    def song_changed(self, path: Path) -> None:
+
+        """Replaced mp3: re-hash it and re-validate its tags."""
+
+        if self._is_own_write(path):
+            return
+
+        song = Song(path, storage=self.storage)
+        xxhash = song.get_hash()
+        if xxhash is None:
+            return
+
+        for old_hash, old_path in list(self.songs.items()):
+            if old_path == path and old_hash != xxhash:
+                del self.songs[old_hash]
+        self.songs[xxhash] = path
+
+        if song.xxHash and song.xxHash != xxhash:
+            print(f"{path.name}: audio changed, tags say {song.xxHash} but the audio hashes to {xxhash}")
+
+        try:
+            validate_payload(validation_payload(song))
+        except ValidationError as e:
+            print(f"{path.name}: {e}")
+        else:
+            print(f"{path.name}: ok ({xxhash})")
+
+    def song_removed(self, path: Path) -> None:
+
+        if self._is_own_write(path):
+            return
+
+        for xxhash, song_path in list(self.songs.items()):
+            if song_path == path:
+                del self.songs[xxhash]
+
+
+def _payload_after(song: Song, metadata: dict[str, str | int | float]) -> str:
+
+    """The payload song would have once metadata is loaded, without touching song."""
+
+    preview = object.__new__(Song)
+    preview.load_dict({field: getattr(song, field) for field in Song.FIELDS})
+    preview.load_hjson(metadata)
+
+    return preview.build_payload()
+
+def migrate_hashes(root: Path | str, library: Path | str, scheme: str = DEFAULT_SCHEME, write_tags: bool = False,
+                   dry_run: bool = False, storage: Storage | None = None) -> list[Path]:
+
+    """
+    Add AudioHash next to xxHash in every record whose mp3 is in the library, the legacy value is kept.
+    With write_tags the mp3 payloads get it too. Returns the records that changed.
+    """
+
+    songs: dict[str, Song] = {}
+    for song in get_all_mp3_as_obj(library, storage=storage):
+        # freshly computed, a stale AudioHash in the tags is never copied into a record
+        hashes = song.verified_hashes(scheme)
+        if hashes is None:
+            continue
+
+        song.xxHash = hashes[LEGACY]
+        song.AudioHash = hashes[scheme]
+        songs[hash_key(song.xxHash)] = song
+
+    changed: list[Path] = []
+
+    for path in sorted(Path(root).rglob('*.hjson')):
+        metadata = load_record(path)
+        song = songs.get(hash_key(str(metadata.get("xxHash", "")))) if metadata else None
+        if metadata is None or song is None:
+            continue
+
+        if hash_key(str(metadata.get("AudioHash", ""))) == hash_key(song.AudioHash):
+            continue
+
+        metadata["AudioHash"] = song.AudioHash
+        changed.append(path)
+
+        if dry_run:
+            continue
+
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(hjson.dumps(metadata))
+
+        if write_tags:
+            song.load_hjson(metadata)
+            song.set_tags()
+
+    return changed
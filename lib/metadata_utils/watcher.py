@@ -0,0 +1,218 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from collections.abc import Iterable
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CHANGED = "changed"
+REMOVED = "removed"
+RESCAN = "rescan" # events were lost, reported once per root: everything under it has to be checked again
+
+POLL_INTERVAL = 0.5
+DEBOUNCE_DELAY = 0.2 # quiet time before a burst of events is handled
+DEBOUNCE_MAX_WAIT = 2.0 # a never ending burst is still handled after this
+
+# from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _is_hidden(path: Path) -> bool:
+    # .git, and the temp files made by atomic writes
+    return path.name.startswith('.')
+
+def _walk_dirs(root: Path) -> Iterable[Path]:
+
+    yield root
+
+    for dirpath, dirnames, _ in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for d in dirnames:
+            yield Path(dirpath) / d
+
+
+class PollingWatcher:
+
+    """Fallback for systems without inotify (and network mounts, which don't send events): compares snapshots."""
+
+    def __init__(self, roots: Iterable[Path | str], interval: float = POLL_INTERVAL):
+        self.roots = [Path(root) for root in roots]
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self) -> dict[Path, tuple[float, int]]:
+
+        snapshot: dict[Path, tuple[float, int]] = {}
+
+        for root in self.roots:
+            for directory in _walk_dirs(root):
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if entry.is_file() and not entry.name.startswith('.'):
+                                st = entry.stat()
+                                snapshot[Path(entry.path)] = (st.st_mtime, st.st_size)
+                except FileNotFoundError:
+                    continue
+
+        return snapshot
+
+    def poll(self, timeout: float) -> list[tuple[Path, str]]:
+
+        time.sleep(min(timeout, self.interval))
+
+        snapshot = self._scan()
+        events = [(path, CHANGED) for path, stat in snapshot.items() if self.snapshot.get(path) != stat]
+        events += [(path, REMOVED) for path in self.snapshot if path not in snapshot]
+        self.snapshot = snapshot
+
+        return events
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+
+    """Recursive watch through Linux inotify, called with ctypes so there's no extra dependency."""
+
+    def __init__(self, roots: Iterable[Path | str]):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.roots = [Path(root) for root in roots]
+        self.watches: dict[int, Path] = {}
+        for root in self.roots:
+            for directory in _walk_dirs(root):
+                self._add_watch(directory)
+
+    def _add_watch(self, directory: Path) -> None:
+
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            # a folder removed right after it was created isn't worth a warning
+            if error != errno.ENOENT:
+                logger.warning(f"Can't watch {directory}: {os.strerror(error)}")
+            return
+
+        self.watches[wd] = directory
+
+    def poll(self, timeout: float) -> list[tuple[Path, str]]:
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            buffer = os.read(self.fd, 65_536)
+        except BlockingIOError:
+            return []
+
+        events: list[tuple[Path, str]] = []
+        offset = 0
+
+        while offset < len(buffer):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflowed, some events were lost, rescanning")
+                for root in self.roots:
+                    # folders created while the queue was full aren't watched yet
+                    for new_directory in _walk_dirs(root):
+                        self._add_watch(new_directory)
+                    events.append((root, RESCAN))
+                continue
+
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+
+            path = directory / name
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # watch the new folder, and report what was already put in it
+                    for new_directory in _walk_dirs(path):
+                        self._add_watch(new_directory)
+                        try:
+                            events += [(file, CHANGED) for file in new_directory.iterdir() if file.is_file()]
+                        except OSError:
+                            # already removed again
+                            continue
+                continue
+
+            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                events.append((path, CHANGED))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                events.append((path, REMOVED))
+
+        return [(path, kind) for path, kind in events if not _is_hidden(path)]
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def make_watcher(roots: Iterable[Path | str], polling: bool = False) -> InotifyWatcher | PollingWatcher:
+
+    roots = list(roots)
+
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(roots)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify unavailable, polling instead: {e}")
+
+    return PollingWatcher(roots)
+
+def debounced(watcher: InotifyWatcher | PollingWatcher, delay: float = DEBOUNCE_DELAY,
+              max_wait: float = DEBOUNCE_MAX_WAIT) -> Iterable[dict[Path, str]]:
+
+    """
+    Yield batches of {path: last event}, each once the burst it belongs to has been quiet for `delay`.
+    An editor saving through a temp file, or a script touching many files, gives one batch.
+    """
+
+    pending: dict[Path, str] = {}
+    first = 0.0
+
+    while True:
+        events = watcher.poll(delay if pending else 1.0)
+
+        if events:
+            if not pending:
+                first = time.monotonic()
+            for path, kind in events:
+                pending[path] = kind
+            if time.monotonic() - first < max_wait:
+                continue
+
+        if pending:
+            yield pending
+            pending = {}
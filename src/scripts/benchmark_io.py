@@ -0,0 +1,36 @@
+import argparse
+from pathlib import Path
+from time import perf_counter
+
+from metadata_utils.CF_Program import get_all_mp3_as_obj
+from metadata_utils.storage import LatencyFS, Storage
+
+
+def run(directory: Path, storage: Storage) -> None:
+
+    start = perf_counter()
+    songs = get_all_mp3_as_obj(directory, storage=storage)
+    loaded = perf_counter()
+    storage.map(lambda song: song.get_hash(), songs)
+    hashed = perf_counter()
+
+    round_trips = getattr(storage.fs, "round_trips", "-")
+    print(f"  concurrency={storage.concurrency} read_ahead={storage.read_ahead} batch_stats={storage.batch_stats}")
+    print(f"  {len(songs)} songs, scan + tags {round(loaded - start, 2)}s, hash {round(hashed - loaded, 2)}s, {round_trips} round trips")
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark the storage layer against a simulated high-latency mount.")
+    parser.add_argument("directory", type=Path, help="Folder with mp3s")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to every filesystem call")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    print("Naive (one call at a time, no read-ahead, one stat per file):")
+    run(args.directory, Storage(LatencyFS(args.latency), concurrency=1, read_ahead=0, batch_stats=False))
+
+    print("Tuned:")
+    run(args.directory, Storage(LatencyFS(args.latency), concurrency=args.concurrency, batch_stats=True))
+
+if __name__ == "__main__":
+    main()
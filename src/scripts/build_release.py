@@ -0,0 +1,40 @@
+import argparse
+from pathlib import Path
+from time import perf_counter
+
+from metadata_utils.release import build_release, collect_records, make_delta, read_release, write_delta
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Build a reproducible zip of the hjson records.")
+    parser.add_argument("--root", type=Path, default=REPO_ROOT, help="Folder with the DISC folders")
+    parser.add_argument("--output", type=Path, default=Path("metadata-zip.zip"))
+    parser.add_argument("--previous", type=Path, help="Previous release zip, unchanged records are copied from it")
+    parser.add_argument("--delta", type=Path, help="Where to write the changes since the previous release")
+    args = parser.parse_args()
+
+    start = perf_counter()
+
+    records = collect_records(args.root)
+
+    previous = {}
+    if args.previous and args.previous.exists():
+        previous = read_release(args.previous)
+    elif args.previous:
+        print(f"No previous release found at {args.previous}, compressing everything")
+
+    reused, compressed = build_release(records, args.output, previous)
+    print(f"{args.output}: {len(records)} records, {reused} reused, {compressed} compressed")
+
+    if args.delta:
+        delta = make_delta(previous, records)
+        write_delta(args.delta, delta)
+        print(f"{args.delta}: " + ", ".join(f"{len(delta[key])} {key}" for key in ("added", "changed", "removed", "renamed")))
+
+    print(f"Runtime: {round(perf_counter() - start, 2)} second(s).")
+
+if __name__ == "__main__":
+    main()
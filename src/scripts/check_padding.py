@@ -0,0 +1,37 @@
+import argparse
+from pathlib import Path
+from time import perf_counter
+
+from metadata_utils.CF_Program import get_all_mp3_as_obj
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="List the songs whose next tag update would rewrite the whole file.")
+    parser.add_argument("library", type=Path, help="Folder with the mp3s")
+    parser.add_argument("--fix", action="store_true", help="Rewrite them once now, reserving padding for later edits")
+    args = parser.parse_args()
+
+    start = perf_counter()
+    songs = get_all_mp3_as_obj(args.library)
+
+    rewrites = [song for song in songs if song.would_rewrite_audio()]
+    for song in rewrites:
+        print(f"Full rewrite: {song.path}")
+
+    print(f"{len(rewrites)} of {len(songs)} songs need a full rewrite, the rest update in place.")
+
+    if args.fix:
+        repadded = 0
+        for song in rewrites:
+            # only the padding changes, the frames are saved as they are
+            if song.repad():
+                repadded += 1
+            else:
+                print(f"No ID3 tag, skipped: {song.path}")
+        print(f"Re-padded {repadded} songs.")
+
+    print(f"Runtime: {round(perf_counter() - start, 2)} second(s).")
+
+if __name__ == "__main__":
+    main()
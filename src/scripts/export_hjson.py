@@ -0,0 +1,33 @@
+import argparse
+from pathlib import Path
+from time import perf_counter
+
+from metadata_utils.export import export_library
+from metadata_utils.storage import DEFAULT_CONCURRENCY, Storage
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Regenerate the hjson records from the mp3 library, writing only what changed.")
+    parser.add_argument("library", type=Path, help="Folder with the mp3s")
+    parser.add_argument("--output", type=Path, default=REPO_ROOT, help="Folder with the DISC folders")
+    parser.add_argument("--workers", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--prune", action="store_true", help="Delete records with no mp3 behind them")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args()
+
+    start = perf_counter()
+    report = export_library(args.library, args.output, storage=Storage(concurrency=args.workers),
+                            prune=args.prune, dry_run=args.dry_run)
+
+    for label, paths in (("Added", report.added), ("Changed", report.changed), ("Removed", report.removed)):
+        for path in paths:
+            print(f"{label}: {path.relative_to(args.output)}")
+
+    print(report)
+    print(f"Runtime: {round(perf_counter() - start, 2)} second(s).")
+
+if __name__ == "__main__":
+    main()
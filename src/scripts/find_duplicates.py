@@ -0,0 +1,68 @@
+import argparse
+from pathlib import Path
+from time import perf_counter
+
+from metadata_utils.CF_Program import Song
+from metadata_utils.fingerprint import DEFAULT_MIN_SHARED, FingerprintIndex
+
+
+def build_index(directory: Path, min_shared: int) -> FingerprintIndex:
+
+    index = FingerprintIndex(min_shared=min_shared)
+
+    for path in sorted(directory.rglob('*.mp3')):
+        if not path.is_file():
+            continue
+
+        fingerprint = Song(path).get_fingerprint()
+        if fingerprint:
+            index.add(str(path), fingerprint)
+
+    return index
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Find likely duplicate or re-uploaded songs by their audio fingerprint.",
+        epilog="Trimmed uploads are found when the trim is shorter than about 20 KB of audio (about a second) "
+               "on each end, or when one end is left untouched.",
+    )
+    parser.add_argument("archive", type=Path, help="Folder with the archive mp3s")
+    parser.add_argument("uploads", type=Path, nargs="?", help="Folder with new mp3s to check against the archive")
+    parser.add_argument("--index", type=Path, help="Fingerprint cache of the archive, built if missing")
+    parser.add_argument("--min-shared", type=int, default=DEFAULT_MIN_SHARED, help="Windows two songs must share")
+    args = parser.parse_args()
+
+    start = perf_counter()
+
+    index = None
+    if args.index and args.index.exists():
+        try:
+            index = FingerprintIndex.load(args.index, min_shared=args.min_shared)
+        except ValueError as e:
+            print(e)
+
+    if index is None:
+        index = build_index(args.archive, args.min_shared)
+        if args.index:
+            index.save(args.index)
+
+    print(f"Archive index: {len(index)} songs ({round(perf_counter() - start, 2)} second(s))")
+
+    if args.uploads is None:
+        for first, second, shared in index.duplicates():
+            print(f"[{shared}] {first}\n    {second}")
+        return
+
+    for path in sorted(args.uploads.rglob('*.mp3')):
+        fingerprint = Song(path).get_fingerprint()
+        if not fingerprint:
+            continue
+
+        for key, shared in index.query(fingerprint):
+            print(f"[{shared}] {path}\n    {key}")
+
+    print(f"Runtime: {round(perf_counter() - start, 2)} second(s).")
+
+if __name__ == "__main__":
+    main()
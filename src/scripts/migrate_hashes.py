@@ -0,0 +1,31 @@
+import argparse
+from pathlib import Path
+from time import perf_counter
+
+from metadata_utils.hashing import DEFAULT_SCHEME, HASHERS
+from metadata_utils.sync import migrate_hashes
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Add the xxh3 AudioHash next to the legacy xxHash in the records.")
+    parser.add_argument("library", type=Path, help="Folder with the mp3s")
+    parser.add_argument("--root", type=Path, default=REPO_ROOT, help="Folder with the DISC folders")
+    parser.add_argument("--scheme", choices=sorted(HASHERS), default=DEFAULT_SCHEME)
+    parser.add_argument("--tags", action="store_true", help="Also write AudioHash to the mp3 payloads")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args()
+
+    start = perf_counter()
+    changed = migrate_hashes(args.root, args.library, args.scheme, write_tags=args.tags, dry_run=args.dry_run)
+
+    for path in changed:
+        print(f"Migrated: {path.relative_to(args.root)}")
+
+    print(f"{len(changed)} record(s) migrated.")
+    print(f"Runtime: {round(perf_counter() - start, 2)} second(s).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import argparse
+from pathlib import Path
+from time import perf_counter
+
+from metadata_utils.musicbrainz import MusicBrainzIndex, build_index, iter_dump, match_records
+from metadata_utils.sync import load_record
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Check the hjson records against a local MusicBrainz dump.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    importer = subparsers.add_parser("import", help="Build the index from a dump")
+    importer.add_argument("dump", type=Path, help="JSON-lines (.json, .jsonl, .tar.xz, ...) or TSV with a header row")
+    importer.add_argument("--index", type=Path, default=Path("musicbrainz.sqlite"))
+
+    matcher = subparsers.add_parser("match", help="Propose corrections for the records")
+    matcher.add_argument("--index", type=Path, default=Path("musicbrainz.sqlite"))
+    matcher.add_argument("--root", type=Path, default=REPO_ROOT, help="Folder with the DISC folders")
+    args = parser.parse_args()
+
+    start = perf_counter()
+
+    if args.command == "import":
+        count = build_index(iter_dump(args.dump), args.index)
+        print(f"Indexed {count} recordings in {args.index}")
+
+    else:
+        records = ((path, record) for path in sorted(args.root.rglob('*.hjson')) if (record := load_record(path)))
+        proposals = 0
+
+        with MusicBrainzIndex(args.index) as index:
+            for path, matched, corrections in match_records(index, records):
+                proposals += 1
+                print(path.relative_to(args.root))
+                for recording in matched:
+                    print(f"    https://musicbrainz.org/recording/{recording.mbid}")
+                for field, (current, proposed) in corrections.items():
+                    print(f"    {field}: {current!r} -> {proposed!r}")
+
+        print(f"{proposals} record(s) with proposed corrections.")
+
+    print(f"Runtime: {round(perf_counter() - start, 2)} second(s).")
+
+if __name__ == "__main__":
+    main()
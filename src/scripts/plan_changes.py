@@ -0,0 +1,49 @@
+import argparse
+import json
+from pathlib import Path
+from time import perf_counter
+
+from metadata_utils.CF_Program import get_all_mp3_as_obj
+from metadata_utils.planner import SKIP, plan_library
+from metadata_utils.sync import load_records
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="List what a sync would do to the mp3 library and what it would cost, without changing anything.")
+    parser.add_argument("library", type=Path, help="Folder with the mp3s")
+    parser.add_argument("--root", type=Path, default=REPO_ROOT, help="Folder with the DISC folders")
+    parser.add_argument("--no-save", action="store_true", help="Don't plan the hjson records being applied")
+    parser.add_argument("--album-images", action="store_true", help="Plan set_album_image")
+    parser.add_argument("--lyrics", type=Path, help="Folder with .lrc files named after the songs, plans embed_lyrics")
+    parser.add_argument("--remux", action="store_true", help="Plan remux_song")
+    parser.add_argument("--bandwidth", type=float, help="MB/s of the storage, for a time estimate")
+    parser.add_argument("--all", action="store_true", help="Also list skipped operations")
+    parser.add_argument("--output", type=Path, help="Write the plan as JSON")
+    args = parser.parse_args()
+
+    start = perf_counter()
+    records = None if args.no_save else load_records(args.root)
+    songs = get_all_mp3_as_obj(args.library)
+
+    plan = plan_library(songs, records, args.album_images, args.lyrics, args.remux)
+
+    for operation in plan.operations:
+        if args.all or operation.mode != SKIP:
+            print(operation)
+
+    print(plan)
+    if args.bandwidth:
+        seconds = (plan.read + plan.written) / (args.bandwidth * 1024 * 1024)
+        print(f"About {round(seconds)} second(s) of I/O at {args.bandwidth} MB/s.")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(plan.as_dict(), f, ensure_ascii=False, indent=1)
+
+    print(f"Runtime: {round(perf_counter() - start, 2)} second(s).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import argparse
+from pathlib import Path
+from time import perf_counter
+
+from metadata_utils.search import CatalogIndex
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Search the hjson catalog.")
+    parser.add_argument("--root", type=Path, default=REPO_ROOT, help="Folder with the DISC folders")
+    parser.add_argument("--title", default="")
+    parser.add_argument("--artist", default="")
+    parser.add_argument("--cover", default="", help="Cover artist, e.g. Evil")
+    parser.add_argument("--disc", default="")
+    parser.add_argument("--from", dest="date_from", default="", help="Earliest date, e.g. 2024 or 2024-03")
+    parser.add_argument("--to", dest="date_to", default="", help="Latest date, inclusive")
+    parser.add_argument("--duet", action=argparse.BooleanOptionalAction, default=None)
+    parser.add_argument("--prefix", action="store_true", help="Match the start of words instead of whole words")
+    parser.add_argument("--timing", action="store_true")
+    args = parser.parse_args()
+
+    start = perf_counter()
+    index = CatalogIndex.from_folder(args.root)
+    built = perf_counter()
+
+    results = index.search(
+        title=args.title,
+        artist=args.artist,
+        cover=args.cover,
+        disc=args.disc,
+        date_from=args.date_from,
+        date_to=args.date_to,
+        duet=args.duet,
+        prefix=args.prefix,
+    )
+    searched = perf_counter()
+
+    for record_id in results:
+        print(index.paths[record_id].relative_to(args.root))
+
+    print(f"{len(results)} result(s).")
+    if args.timing:
+        print(f"Index: {len(index)} records in {round(built - start, 3)}s, query: {round((searched - built) * 1e6)}µs")
+
+if __name__ == "__main__":
+    main()
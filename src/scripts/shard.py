@@ -0,0 +1,91 @@
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from time import perf_counter
+
+from metadata_utils.shards import BY_DISC, BY_HASH, TASKS, clear_manifests, load_manifests, merge_manifests, process_shard, write_manifest
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+
+
+def work(library: Path, index: int, count: int, by: str, tasks: tuple[str, ...], root: Path, manifests: Path) -> Path:
+    manifest = process_shard(library, index, count, by, tasks, root)
+    return write_manifest(manifests, manifest)
+
+def merge(manifests: Path, output: Path | None, count: int | None = None) -> None:
+
+    merged = merge_manifests(load_manifests(manifests, count))
+
+    for conflict in merged["conflicts"]:
+        print(f"Conflict ({conflict['type']}): {conflict.get('key', '')} {conflict.get('paths', conflict.get('shards', ''))}")
+    for song in merged["errors"]:
+        print(f"Error: {song['path']}: {'; '.join(song['errors'])}")
+
+    print(f"{merged['shards']} shards, {len(merged['songs'])} songs, {len(merged['errors'])} with errors, "
+          f"{len(merged['conflicts'])} conflicts.")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(merged, f, ensure_ascii=False, indent=1)
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Process the library in shards, on one or several machines, and merge the results.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_shard_options(subparser: argparse.ArgumentParser) -> None:
+        subparser.add_argument("library", type=Path, help="Folder with the mp3s (shared storage for several machines)")
+        subparser.add_argument("--count", type=int, required=True, help="Number of shards")
+        subparser.add_argument("--by", choices=(BY_DISC, BY_HASH), default=BY_DISC)
+        subparser.add_argument("--tasks", default="hash,validate", help=f"Comma separated, from {', '.join(TASKS)}")
+        subparser.add_argument("--root", type=Path, default=REPO_ROOT, help="Folder with the DISC folders")
+        subparser.add_argument("--manifests", type=Path, default=Path("manifests"), help="Where the shard manifests go")
+
+    worker = subparsers.add_parser("work", help="Process one shard (run one per machine or process)")
+    add_shard_options(worker)
+    worker.add_argument("--shard", type=int, required=True, help="Index of this shard, from 0")
+
+    runner = subparsers.add_parser("run", help="Process every shard with local processes, then merge")
+    add_shard_options(runner)
+    runner.add_argument("--output", type=Path, help="Merged manifest")
+
+    merger = subparsers.add_parser("merge", help="Merge the shard manifests and report conflicts")
+    merger.add_argument("--manifests", type=Path, default=Path("manifests"))
+    merger.add_argument("--count", type=int, help="Number of shards of the run to merge, the latest run by default")
+    merger.add_argument("--output", type=Path, help="Merged manifest")
+
+    args = parser.parse_args()
+    start = perf_counter()
+
+    if args.command in ("work", "run"):
+        tasks = tuple(task.strip() for task in args.tasks.split(',') if task.strip())
+        unknown = set(tasks) - set(TASKS)
+        if unknown:
+            parser.error(f"Unknown tasks: {', '.join(sorted(unknown))}")
+
+    if args.command == "work":
+        path = work(args.library, args.shard, args.count, args.by, tasks, args.root, args.manifests)
+        print(f"Manifest written to {path}")
+
+    elif args.command == "run":
+        # manifests of an earlier run would be merged with these
+        clear_manifests(args.manifests)
+
+        with ProcessPoolExecutor(max_workers=args.count) as pool:
+            futures = [
+                pool.submit(work, args.library, index, args.count, args.by, tasks, args.root, args.manifests)
+                for index in range(args.count)
+            ]
+            for future in futures:
+                print(f"Manifest written to {future.result()}")
+
+        merge(args.manifests, args.output, args.count)
+
+    else:
+        merge(args.manifests, args.output, args.count)
+
+    print(f"Runtime: {round(perf_counter() - start, 2)} second(s).")
+
+if __name__ == "__main__":
+    main()
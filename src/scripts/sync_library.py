@@ -0,0 +1,56 @@
+import argparse
+from pathlib import Path
+from time import perf_counter
+
+from metadata_utils.CF_Program import get_all_mp3_as_obj
+from metadata_utils.journal import Journal, journaled_save
+from metadata_utils.sync import find_record, load_records
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Apply the hjson records to the mp3 library.")
+    parser.add_argument("library", type=Path, help="Folder with the mp3s")
+    parser.add_argument("--root", type=Path, default=REPO_ROOT, help="Folder with the DISC folders")
+    parser.add_argument("--journal", type=Path, help="Checkpoint file, makes writes atomic and lets a killed run resume")
+    args = parser.parse_args()
+
+    start = perf_counter()
+    records = load_records(args.root)
+    songs = get_all_mp3_as_obj(args.library)
+
+    journal = Journal(args.journal, args.library) if args.journal else None
+    updated = skipped = 0
+
+    try:
+        for song in songs:
+            metadata = find_record(records, song)
+            if metadata is None:
+                print(f"No record found for {song.path.name}")
+                continue
+
+            song.load_hjson(metadata)
+
+            try:
+                if journal is None:
+                    song.save()
+                    updated += 1
+                elif journaled_save(song, journal):
+                    updated += 1
+                else:
+                    skipped += 1
+
+            except FileExistsError as e:
+                print(e)
+
+    finally:
+        if journal is not None:
+            journal.close()
+
+    print(f"{updated} updated, {skipped} already done.")
+    print(f"Runtime: {round(perf_counter() - start, 2)} second(s).")
+
+if __name__ == "__main__":
+    main()
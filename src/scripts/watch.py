@@ -0,0 +1,39 @@
+import argparse
+from pathlib import Path
+from time import perf_counter
+
+from metadata_utils.sync import LibrarySync
+from metadata_utils.watcher import DEBOUNCE_DELAY, debounced, make_watcher
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Watch the hjson records and the mp3 library, re-syncing what changes.")
+    parser.add_argument("library", type=Path, help="Folder with the mp3s")
+    parser.add_argument("--root", type=Path, default=REPO_ROOT, help="Folder with the DISC folders")
+    parser.add_argument("--poll", action="store_true", help="Poll instead of using inotify (network mounts)")
+    parser.add_argument("--delay", type=float, default=DEBOUNCE_DELAY, help="Seconds of quiet before handling a burst")
+    args = parser.parse_args()
+
+    sync = LibrarySync(args.root, args.library)
+    sync.build()
+
+    watcher = make_watcher([args.root, args.library], polling=args.poll)
+    print(f"Watching with {type(watcher).__name__}, Ctrl+C to stop")
+
+    try:
+        for batch in debounced(watcher, delay=args.delay):
+            start = perf_counter()
+            sync.handle(batch)
+            print(f"Handled {len(batch)} change(s) in {round(perf_counter() - start, 3)} second(s).")
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        watcher.close()
+
+if __name__ == "__main__":
+    main()